@@ -0,0 +1,65 @@
+import numpy as np
+from SokobanPuzzle import cells_of
+
+
+class BatchEngine:
+    """Vectorized move generation over whole layers of states of one level.
+
+    A layer is an array of robot cells and an (n, boxes) array of box cells,
+    each row sorted, so a layer of any size is expanded, hashed, checked
+    for dead cells and goals and scored with a handful of NumPy operations
+    instead of a Python loop per state.
+    """
+    def __init__(self, level):
+        self.level = level
+        self.step = np.array(level.step, dtype=np.int64)  # step[d][cell], -1 for a wall or the edge
+        self.dead = np.frombuffer(bytes(level.dead), dtype=np.uint8).astype(bool)
+        self.target = np.zeros(level.size, dtype=bool)
+        self.target[list(level.target_cells)] = True
+        self.zobrist_box = np.array(level.zobrist_box, dtype=np.uint64)
+        self.zobrist_player = np.array(level.zobrist_player, dtype=np.uint64)
+        # Pushes from every cell to its nearest target, the per-box term of heuristic()
+        distances = np.array(level.target_dist, dtype=np.int64).reshape(level.size, len(level.target_cells))
+        self.nearest = distances.min(axis=1) if len(level.target_cells) else np.zeros(level.size, dtype=np.int64)
+
+    def layer(self, puzzle):
+        """Return the (players, boxes) layer holding only puzzle's state."""
+        return np.array([puzzle.player], dtype=np.int64), np.array([list(cells_of(puzzle.boxes))], dtype=np.int64)
+
+    def keys(self, players, boxes):
+        """Zobrist keys of a layer's states, equal to SokobanPuzzle.key() of the same states."""
+        return self.zobrist_player[players] ^ np.bitwise_xor.reduce(self.zobrist_box[boxes], axis=1)
+
+    def expand(self, players, boxes):
+        """Return (players, boxes, parents, actions) of every legal move of every state of a layer.
+
+        parents is the row of the state each move was played from and actions
+        its direction index. Pushes onto a dead cell are dropped, unless there
+        are more boxes than targets: a spare box may be parked anywhere.
+        """
+        rows = np.arange(len(players))
+        prune = boxes.shape[1] <= len(self.level.target_cells)  # The box count is the same for the whole layer
+        layers = []
+        for d in range(4):
+            new_player = self.step[d][players]
+            legal = new_player >= 0
+            new_player = np.where(legal, new_player, 0)
+            hit = boxes == new_player[:, None]  # The box (if any) the robot walks into
+            pushing = hit.any(axis=1)
+            dest = self.step[d][new_player]
+            blocked = (dest < 0) | (boxes == dest[:, None]).any(axis=1)
+            if prune:
+                blocked |= self.dead[dest]
+            legal &= ~(pushing & blocked)
+            moved = np.where(hit, dest[:, None], boxes)[legal]
+            moved.sort(axis=1)
+            layers.append((new_player[legal], moved, rows[legal], np.full(legal.sum(), d)))
+        return tuple(np.concatenate(parts) for parts in zip(*layers))
+
+    def is_goal(self, boxes):
+        """Boolean array of the states of a layer with every target holding a box."""
+        return self.target[boxes].sum(axis=1) == len(self.level.target_cells)
+
+    def heuristic(self, boxes):
+        """Sum over boxes of the pushes to their nearest target: a lower bound on the pushes left."""
+        return self.nearest[boxes].sum(axis=1)
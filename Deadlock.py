@@ -0,0 +1,137 @@
+from collections import deque
+
+
+def simple_dead_cells(level):
+    """Mark every floor cell from which a box can never be pushed to a target.
+
+    A box can reach a target from a cell exactly when the box can be pulled
+    from that target back to the cell, so the live cells are found with a
+    breadth-first search of box pulls starting from every target.
+    """
+    step = level.step
+    live = bytearray(level.size)
+    queue = deque(level.target_cells)
+    for cell in level.target_cells:
+        live[cell] = 1
+
+    while queue:
+        box = queue.popleft()
+        for d in range(len(step)):
+            # Pulling the box one cell in direction d needs the player two cells away in that direction
+            behind = step[d][box]
+            if behind < 0 or live[behind] or step[d][behind] < 0:
+                continue
+            live[behind] = 1
+            queue.append(behind)
+
+    # Walls are never dead cells, they simply cannot hold a box
+    return bytearray(0 if live[cell] or level.walls[cell] else 1 for cell in range(level.size))
+
+
+class DeadlockDetector:
+    """Deadlock checks run in successor generation on the box that was just pushed.
+
+    Each check can be switched off, and the number of pushes each one pruned
+    is counted so their effect can be measured per level. A Patterns.PatternStore
+    set as patterns is matched (and learns) after the other checks.
+    """
+    def __init__(self, level, dead_cells=True, squares=True, freeze=True):
+        self.level = level
+        self.dead_cells = dead_cells  # Box pushed onto a precomputed dead cell
+        self.squares = squares  # Box completing a 2x2 block of boxes and walls
+        self.freeze = freeze  # Box frozen on both axes with a frozen box off target
+        self.patterns = None  # Box patterns proven dead by sub-searches
+        self.pruned_dead = 0
+        self.pruned_square = 0
+        self.pruned_freeze = 0
+        self.pruned_pattern = 0
+
+    @property
+    def pruned(self):
+        """Total number of pushes pruned by every check."""
+        return self.pruned_dead + self.pruned_square + self.pruned_freeze + self.pruned_pattern
+
+    def is_deadlock(self, boxes, cell):
+        """Return True if the box just pushed onto cell makes the position unsolvable.
+
+        With more boxes than targets a spare box may be parked anywhere, so a
+        box on a dead cell, in a 2x2 block or frozen off target is not a
+        deadlock there.
+        """
+        spare = boxes.bit_count() > len(self.level.target_cells)
+        if self.dead_cells and not spare and self.level.dead[cell]:
+            self.pruned_dead += 1
+            return True
+        if self.squares and not spare and self._in_square(boxes, cell):
+            self.pruned_square += 1
+            return True
+        if self.freeze and not spare and self._frozen_off_target(boxes, cell):
+            self.pruned_freeze += 1
+            return True
+        if self.patterns is not None and self.patterns.is_dead(boxes, cell):
+            self.pruned_pattern += 1
+            return True
+        return False
+
+    def _occupied(self, boxes, r, c):
+        """True if (r, c) is off the board, a wall or a box."""
+        level = self.level
+        if not (0 <= r < level.rows and 0 <= c < level.cols):
+            return True
+        cell = r * level.cols + c
+        return level.walls[cell] or boxes >> cell & 1
+
+    def _in_square(self, boxes, cell):
+        """True if cell is part of a 2x2 block of walls and boxes holding a box off target."""
+        level = self.level
+        r, c = divmod(cell, level.cols)
+        for top in (r - 1, r):
+            for left in (c - 1, c):
+                square = [(top, left), (top, left + 1), (top + 1, left), (top + 1, left + 1)]
+                if not all(self._occupied(boxes, sr, sc) for sr, sc in square):
+                    continue
+                # The block is only a deadlock if one of its boxes is not on a target
+                for sr, sc in square:
+                    if 0 <= sr < level.rows and 0 <= sc < level.cols:
+                        block_cell = sr * level.cols + sc
+                        if boxes >> block_cell & 1 and not level.target_mask >> block_cell & 1:
+                            return True
+        return False
+
+    def _frozen_off_target(self, boxes, cell):
+        """True if the box on cell is frozen together with at least one frozen box off target."""
+        frozen = []
+        if not self._frozen(boxes, cell, set(), frozen):
+            return False
+        target_mask = self.level.target_mask
+        return any(not target_mask >> box & 1 for box in frozen)
+
+    def _frozen(self, boxes, cell, assumed, frozen):
+        """True if the box on cell can move on neither axis; boxes in assumed are treated as walls.
+
+        On failure every box found frozen while checking this one is taken
+        back out of frozen and assumed, since it may only have been frozen
+        because this box was assumed to be a wall.
+        """
+        mark = len(frozen)
+        assumed.add(cell)  # Treat this box as a wall while its neighbours are checked
+        if self._blocked(boxes, cell, 0, assumed, frozen) and self._blocked(boxes, cell, 2, assumed, frozen):
+            frozen.append(cell)
+            return True
+        assumed.difference_update(frozen[mark:])
+        assumed.discard(cell)
+        del frozen[mark:]
+        return False
+
+    def _blocked(self, boxes, cell, d, assumed, frozen):
+        """True if the box on cell cannot be pushed along the axis of directions d and d + 1."""
+        step = self.level.step
+        a, b = step[d][cell], step[d + 1][cell]
+        if a < 0 or b < 0:  # A wall on either side
+            return True
+        if self.level.dead[a] and self.level.dead[b]:  # Pushing either way lands on a dead cell
+            return True
+        for side in (a, b):
+            if boxes >> side & 1 and (side in assumed or self._frozen(boxes, side, assumed, frozen)):
+                return True
+        return False
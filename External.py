@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# One search record on disk: the state key, its parent's key and the action code leading to it
+RECORD = np.dtype([('key', '<u8'), ('parent', '<u8'), ('code', '<i8')])
+
+
+class SortedRuns:
+    """Set of search records kept on disk in sorted, memory-mapped run files.
+
+    Each added batch becomes a new run sorted by key; once there are more
+    than merge_runs runs they are merged two at a time, chunk records at a
+    time, so neither adding nor merging needs more than a few chunks of RAM.
+    Membership tests are batched: a whole array of keys is binary-searched
+    in every run at once.
+    """
+    def __init__(self, directory=None, merge_runs=8, chunk=1 << 16):
+        self.directory = tempfile.mkdtemp(prefix='sokoban-runs-', dir=directory)
+        self.merge_runs = merge_runs
+        self.chunk = chunk
+        self.runs = []  # Memory-mapped record arrays, each sorted by key
+        self.paths = []
+        self.created = 0  # Number of run files written, names them uniquely
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def bytes(self):
+        """Disk space used by the runs."""
+        return len(self) * RECORD.itemsize
+
+    def _open(self, path, size):
+        self.runs.append(np.memmap(path, dtype=RECORD, mode='r', shape=(size,)))
+        self.paths.append(path)
+
+    def _path(self):
+        self.created += 1
+        return os.path.join(self.directory, f'run-{self.created:06d}.bin')
+
+    def add(self, records):
+        """Write records (keys not in the set yet, unique) as a new run, then merge runs if there are too many."""
+        if not len(records):
+            return
+        records = records[np.argsort(records['key'], kind='stable')]
+        path = self._path()
+        records.tofile(path)
+        self._open(path, len(records))
+        while len(self.runs) > self.merge_runs:
+            self._mergeSmallest()
+
+    def contains(self, keys):
+        """Return a boolean array telling which of the sorted keys are in the set."""
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            run_keys = run['key']
+            position = np.searchsorted(run_keys, keys)
+            inside = position < len(run)
+            found[inside] |= run_keys[position[inside]] == keys[inside]
+        return found
+
+    def lookup(self, key):
+        """Return the record of key, or None."""
+        key = np.uint64(key)
+        for run in self.runs:
+            run_keys = run['key']
+            position = np.searchsorted(run_keys, key)
+            if position < len(run) and run_keys[position] == key:
+                return run[position]
+        return None
+
+    def _mergeSmallest(self):
+        """Merge the two smallest runs into one, a chunk at a time."""
+        order = sorted(range(len(self.runs)), key=lambda i: len(self.runs[i]))[:2]
+        a, b = (self.runs[i] for i in order)
+        old_paths = [self.paths[i] for i in order]
+        for i in sorted(order, reverse=True):
+            del self.runs[i], self.paths[i]
+
+        path = self._path()
+        out = np.memmap(path, dtype=RECORD, mode='w+', shape=(len(a) + len(b),))
+        a_keys, b_keys = a['key'], b['key']
+        i = j = k = 0
+        while i < len(a) or j < len(b):
+            # Everything up to the smaller of the two chunk ends can be written in order
+            limit = min(a_keys[min(i + self.chunk, len(a)) - 1] if i < len(a) else np.iinfo(np.uint64).max,
+                        b_keys[min(j + self.chunk, len(b)) - 1] if j < len(b) else np.iinfo(np.uint64).max)
+            next_i = i + int(np.searchsorted(a_keys[i:], limit, side='right'))
+            next_j = j + int(np.searchsorted(b_keys[j:], limit, side='right'))
+            block = np.concatenate((a[i:next_i], b[j:next_j]))
+            block = block[np.argsort(block['key'], kind='stable')]
+            out[k:k + len(block)] = block
+            k += len(block)
+            i, j = next_i, next_j
+        out.flush()
+        del out, a, b
+        for old in old_paths:
+            os.remove(old)
+        self._open(path, k)
+
+    def close(self):
+        """Delete every run file."""
+        self.runs.clear()
+        self.paths.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
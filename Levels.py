@@ -0,0 +1,199 @@
+import random
+from collections import deque
+from SokobanPuzzle import SokobanPuzzle, PLAYER, WALL, EMPTY, TARGET, BOX, PLAYER_ON_TARGET, BOX_ON_TARGET
+
+# Standard XSB/SOK symbols mapped onto the project's grid constants
+XSB_SYMBOLS = {
+    '#': WALL,
+    ' ': EMPTY,
+    '-': EMPTY,
+    '_': EMPTY,
+    '.': TARGET,
+    '$': BOX,
+    'b': BOX,
+    '*': BOX_ON_TARGET,
+    'B': BOX_ON_TARGET,
+    '@': PLAYER,
+    'p': PLAYER,
+    '+': PLAYER_ON_TARGET,
+    'P': PLAYER_ON_TARGET,
+}
+RLE_SYMBOLS = set('0123456789()|')  # Run lengths, repeated groups and row separators
+
+
+def decode_rle(line):
+    """Expand a run-length encoded board line ("3#|#.@2-#", "2(#$)") into its rows."""
+    def expand(text, i):
+        """Expand text from index i up to the closing parenthesis of its group, returning (string, next index)."""
+        out = []
+        count = ''
+        while i < len(text):
+            char = text[i]
+            if char.isdigit():
+                count += char
+                i += 1
+                continue
+            if char == ')':
+                return ''.join(out), i + 1
+            if char == '(':
+                chunk, i = expand(text, i + 1)
+            else:
+                chunk, i = char, i + 1
+            out.append(chunk * int(count or 1))
+            count = ''
+        return ''.join(out), i
+
+    return expand(line, 0)[0].split('|')
+
+
+def board_rows(line):
+    """Return the board rows held by a line, or None if the line is not part of a board."""
+    if not line or '#' not in line and not RLE_SYMBOLS.intersection(line):
+        return None
+    rows = decode_rle(line) if RLE_SYMBOLS.intersection(line) else [line]
+    if any(symbol not in XSB_SYMBOLS for row in rows for symbol in row) or not any('#' in row for row in rows):
+        return None
+    return rows
+
+
+def to_grid(rows):
+    """Convert XSB rows to a rectangular grid of project symbols and find the player.
+
+    Short rows are padded, and floor outside the walls (not connected to the
+    player) becomes wall so it never counts as playable space.
+    Returns (grid, robot_position).
+    """
+    width = max(len(row) for row in rows)
+    grid = [[XSB_SYMBOLS[symbol] for symbol in row.ljust(width)] for row in rows]
+    robot_position = next(((r, c) for r, row in enumerate(grid) for c, symbol in enumerate(row)
+                           if symbol in (PLAYER, PLAYER_ON_TARGET)), None)
+    if robot_position is None:
+        raise ValueError("Level has no player")
+
+    # Flood fill from the player through everything but walls
+    inside = {robot_position}
+    queue = deque([robot_position])
+    while queue:
+        r, c = queue.popleft()
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < len(grid) and 0 <= nc < width and (nr, nc) not in inside and grid[nr][nc] != WALL:
+                inside.add((nr, nc))
+                queue.append((nr, nc))
+    for r, row in enumerate(grid):
+        for c, symbol in enumerate(row):
+            if symbol == EMPTY and (r, c) not in inside:
+                row[c] = WALL
+    return grid, robot_position
+
+
+def iter_levels(source):
+    """Yield (title, grid, robot_position) for every level of an XSB/SOK collection, one level at a time.
+
+    source is a path or an open text file; it is read line by line, so large
+    collections are never held in memory. The title is a "Title:" field
+    right after the board, else the text line before the board, else "Level <n>".
+    """
+    collection = open(source) if isinstance(source, str) else source
+    try:
+        rows = []  # Rows of the board being read
+        title = None  # Title found before the board
+        ended = False  # The board is complete but its "Title:" field may still follow
+        count = 0
+        for line in collection:
+            line = line.rstrip('\r\n')
+            board = board_rows(line.rstrip())
+            text = line.strip()
+
+            if rows and board is None and not text or ended and board is not None:
+                # A blank line or the next board closes the level
+                count += 1
+                grid, robot_position = to_grid(rows)
+                yield (title or f"Level {count}", grid, robot_position)
+                rows, title, ended = [], None, False
+
+            if board is not None:
+                rows.extend(board)
+                continue
+            if rows:
+                ended = True
+            if not text or text.startswith(';') or text.startswith("'"):
+                continue
+            if text.lower().startswith('title:'):
+                title = text.split(':', 1)[1].strip()
+            elif not ended and title is None and ':' not in text:  # Other "Key: value" fields are metadata
+                title = text
+
+        if rows:
+            count += 1
+            grid, robot_position = to_grid(rows)
+            yield (title or f"Level {count}", grid, robot_position)
+    finally:
+        if collection is not source:
+            collection.close()
+
+
+def load_levels(source):
+    """Return every level of a collection as a list; prefer iter_levels for large files."""
+    return list(iter_levels(source))
+
+
+def unique_levels(levels):
+    """Yield the (title, grid, robot_position) levels that are not a rotation or mirror image of an earlier one.
+
+    Two levels are duplicates when their walls, targets, boxes and the region
+    the player can walk in match up to symmetry.
+    """
+    seen = set()
+    for title, grid, robot_position in levels:
+        key = SokobanPuzzle(grid, robot_position).canonical_key()
+        if key not in seen:
+            seen.add(key)
+            yield title, grid, robot_position
+
+
+def generate_random_grid(rows, cols, num_boxes, num_storage, rng=random):
+    """Generate a walled random level; pass a seeded random.Random as rng to reproduce it."""
+    grid = [[' ' for _ in range(cols)] for _ in range(rows)]
+    
+    # Place outer walls
+    for r in range(rows):
+        grid[r][0] = 'O'
+        grid[r][cols - 1] = 'O'
+    for c in range(cols):
+        grid[0][c] = 'O'
+        grid[rows - 1][c] = 'O'
+
+    def is_valid_position(grid, r, c):
+        # Check if the position is valid for placing a box (not in a corner, etc.)
+        if grid[r][c] != ' ':
+            return False
+        if grid[r-1][c] == 'O' and grid[r][c-1] == 'O':
+            return False
+        if grid[r-1][c] == 'O' and grid[r][c+1] == 'O':
+            return False
+        if grid[r+1][c] == 'O' and grid[r][c-1] == 'O':
+            return False
+        if grid[r+1][c] == 'O' and grid[r][c+1] == 'O':
+            return False
+        return True
+
+    # Randomly place boxes (B) and storage locations (S)
+    placed_boxes = 0
+    placed_storage = 0
+    while placed_boxes < num_boxes or placed_storage < num_storage:
+        r, c = rng.randint(1, rows-2), rng.randint(1, cols-2)
+        if placed_boxes < num_boxes and is_valid_position(grid, r, c):
+            grid[r][c] = 'B'
+            placed_boxes += 1
+        elif placed_storage < num_storage and grid[r][c] == ' ':
+            grid[r][c] = 'S'
+            placed_storage += 1
+
+    while True:
+        r, c = rng.randint(1, rows-2), rng.randint(1, cols-2)
+        if grid[r][c] == ' ':
+            grid[r][c] = 'R'
+            robot_position = (r, c)
+            break
+    
+    return grid, robot_position
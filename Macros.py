@@ -0,0 +1,189 @@
+from collections import deque
+
+
+def tunnel_cells(level):
+    """Mark the floor cells walled in on both sides across each axis.
+
+    tunnel[0][cell] is 1 when cell has walls left and right (a one-wide
+    corridor for up/down pushes), tunnel[1][cell] when it has walls above
+    and below (a corridor for left/right pushes).
+    """
+    step = level.step
+    vertical = bytearray(level.size)
+    horizontal = bytearray(level.size)
+    for cell in range(level.size):
+        if level.walls[cell]:
+            continue
+        vertical[cell] = step[2][cell] < 0 and step[3][cell] < 0
+        horizontal[cell] = step[0][cell] < 0 and step[1][cell] < 0
+    return vertical, horizontal
+
+
+def _room_route(level, allowed, box, player, goal):
+    """Pushes needed to bring the box from box to goal with the player starting on player.
+
+    Only cells of the allowed bitboard can be used by the box and the player.
+    Returns (pushes, direction of the last push), or None if goal cannot be reached.
+    """
+    step = level.step
+    start = (box, player)
+    seen = {start}
+    queue = deque([(box, player, 0, None)])
+    while queue:
+        box, player, pushes, last = queue.popleft()
+        if box == goal:
+            return pushes, last
+        # Cells the player can walk to around the box
+        reach = {player}
+        stack = [player]
+        while stack:
+            cell = stack.pop()
+            for d in range(4):
+                neighbour = step[d][cell]
+                if neighbour >= 0 and neighbour != box and allowed >> neighbour & 1 and neighbour not in reach:
+                    reach.add(neighbour)
+                    stack.append(neighbour)
+        for d in range(4):
+            stand, dest = step[d ^ 1][box], step[d][box]  # d ^ 1 is the opposite direction
+            if stand in reach and dest >= 0 and allowed >> dest & 1 and (dest, box) not in seen:
+                seen.add((dest, box))
+                queue.append((dest, box, pushes + 1, d))
+    return None
+
+
+class GoalRoom:
+    """Targets forming a room with a single entrance, filled in a fixed order.
+
+    order lists the targets deepest first, so a box placed never blocks the
+    way to the next one. routes[(i, player)] is the (pushes, last push
+    direction) bringing a box from the entrance to order[i] once order[:i]
+    is filled, with the player on player outside the entrance.
+    """
+    def __init__(self, mask, entrance, order, routes):
+        self.mask = mask  # Bitboard of the room's targets
+        self.entrance = entrance
+        self.order = order
+        self.filled = [sum(1 << cell for cell in order[:i]) for i in range(len(order) + 1)]  # Boxes after i placements
+        self.routes = routes
+
+
+def goal_rooms(level):
+    """Find the rooms of targets reached through a single floor cell, and an order to fill each one."""
+    step = level.step
+    target_mask = level.target_mask
+    rooms = []
+    seen = 0
+    for first in level.target_cells:
+        if seen >> first & 1:
+            continue
+        # Connected group of targets and the floor cells around it
+        mask = 1 << first
+        stack = [first]
+        border = set()
+        while stack:
+            cell = stack.pop()
+            for d in range(4):
+                neighbour = step[d][cell]
+                if neighbour < 0 or mask >> neighbour & 1:
+                    continue
+                if target_mask >> neighbour & 1:
+                    mask |= 1 << neighbour
+                    stack.append(neighbour)
+                else:
+                    border.add(neighbour)
+        seen |= mask
+        if len(border) != 1:
+            continue
+        entrance = border.pop()
+        outside = [step[d][entrance] for d in range(4) if step[d][entrance] >= 0 and not mask >> step[d][entrance] & 1]
+        room = _fill_order(level, mask, entrance, outside)
+        if room is not None:
+            rooms.append(room)
+    return rooms
+
+
+def _fill_order(level, mask, entrance, outside):
+    """Order the targets of a room deepest first, checking every box can still be pushed in; None if it cannot."""
+    remaining = set(cell for cell in level.target_cells if mask >> cell & 1)
+    order = []
+    routes = {}
+    filled = 0
+    while remaining:
+        best = None
+        for goal in sorted(remaining):
+            found = {}
+            for player in outside:
+                allowed = (mask & ~filled) | 1 << entrance | 1 << player
+                route = _room_route(level, allowed, entrance, player, goal)
+                if route is not None:
+                    found[player] = route
+            if found and (best is None or min(r[0] for r in found.values()) > best[0]):
+                best = (min(r[0] for r in found.values()), goal, found)
+        if best is None:
+            return None
+        _, goal, found = best
+        for player, route in found.items():
+            routes[(len(order), player)] = route
+        order.append(goal)
+        remaining.discard(goal)
+        filled |= 1 << goal
+    return GoalRoom(mask, entrance, tuple(order), routes)
+
+
+class MacroPusher:
+    """Macro pushes applied by the push-level successor generator.
+
+    A box pushed into a tunnel (box and player both walled in across the
+    push) is pushed on until it leaves it, and a box pushed onto the
+    entrance of a goal room is taken straight to the next target of the
+    room's fill order. Each kind can be switched off, and the number of
+    macros taken is counted.
+    """
+    def __init__(self, level, tunnels=True, rooms=True):
+        self.level = level
+        self.tunnels = tunnels
+        self.rooms = rooms
+        self.tunnel = tunnel_cells(level)
+        self.goal_rooms = goal_rooms(level)
+        self.entrances = {room.entrance: room for room in self.goal_rooms}
+        self.tunnel_macros = 0
+        self.room_macros = 0
+
+    def extend(self, boxes, player, dest, d):
+        """Continue the push that just moved a box onto dest in direction d, leaving the player on player.
+
+        boxes already holds the box on dest. Returns a list of (player, boxes,
+        dest, pushes, direction of the last push): the push after any tunnel
+        macro (unchanged with pushes 1 if none applies), then the goal-room
+        macro from there if one applies. The push stopping on the room's
+        entrance is kept, since the fill order may not suit the rest of the
+        level.
+        """
+        level = self.level
+        pushes = 1
+        if self.tunnels:
+            tunnel = self.tunnel[d >> 1]
+            forward = level.step[d]
+            while tunnel[player] and tunnel[dest] and not level.target_mask >> dest & 1:
+                ahead = forward[dest]
+                if ahead < 0 or boxes >> ahead & 1 or level.dead[ahead]:
+                    break
+                boxes ^= 1 << dest | 1 << ahead
+                player, dest = dest, ahead
+                pushes += 1
+            if pushes > 1:
+                self.tunnel_macros += 1
+
+        results = [(player, boxes, dest, pushes, d)]
+        room = self.entrances.get(dest) if self.rooms else None
+        if room is not None:
+            placed = boxes & room.mask
+            i = placed.bit_count()
+            route = room.routes.get((i, player)) if i < len(room.order) and placed == room.filled[i] else None
+            if route is not None:
+                goal = room.order[i]
+                last = route[1]
+                results.append((level.step[last ^ 1][goal], boxes ^ (1 << dest | 1 << goal), goal,
+                                pushes + route[0], last))
+                self.room_macros += 1
+        return results
@@ -0,0 +1,92 @@
+from math import inf
+
+INF_COST = 10 ** 6  # Cost of a pair that can never be matched (e.g. a target a box cannot be pushed to)
+
+
+class Assignment:
+    """Minimum-cost assignment of rows (boxes) to columns (targets).
+
+    The Hungarian algorithm is run one row at a time and the dual potentials
+    are kept, so replacing the costs of a single row (one box moved) only
+    needs one more augmenting phase instead of a full solve.
+    Needs at least as many columns as rows; missing rows are padded with
+    zero-cost dummies so every column stays matched between updates.
+    """
+    def __init__(self, rows, labels=None):
+        self.rows = list(rows)  # rows[i][j] is the cost of matching row i with column j
+        self.labels = list(labels) if labels is not None else list(range(len(self.rows)))
+        self.m = len(self.rows[0]) if self.rows else 0
+        padding = self.m - len(self.rows)
+        self.rows += [(0,) * self.m] * padding
+        self.labels += [None] * padding
+        self.n = len(self.rows)
+        # 1-based potentials and column owners, as in the classic O(n^2 m) formulation
+        self.u = [0] * (self.n + 1)
+        self.v = [0] * (self.m + 1)
+        self.p = [0] * (self.m + 1)  # p[j] is the row matched with column j, 0 if free
+        for i in range(1, self.n + 1):
+            self._augment(i)
+        self.cost = self._total()
+
+    def copy(self):
+        """Return an independent copy sharing the (immutable) cost rows."""
+        other = Assignment.__new__(Assignment)
+        other.rows, other.labels = list(self.rows), list(self.labels)
+        other.n, other.m = self.n, self.m
+        other.u, other.v, other.p = list(self.u), list(self.v), list(self.p)
+        other.cost = self.cost
+        return other
+
+    def replace(self, old_label, new_label, costs):
+        """Replace the row labelled old_label by new costs and re-optimise with one augmenting phase."""
+        i = self.labels.index(old_label) + 1
+        self.labels[i - 1] = new_label
+        self.rows[i - 1] = costs
+        self.p[self.p.index(i)] = 0  # Free the column the row was matched with
+        self.u[i] = 0  # The first step of the phase lowers it back to a feasible value
+        self._augment(i)
+        self.cost = self._total()
+
+    def _total(self):
+        """Sum the costs of the matched pairs."""
+        return sum(self.rows[self.p[j] - 1][j - 1] for j in range(1, self.m + 1) if self.p[j])
+
+    def _augment(self, i):
+        """Match row i along a shortest augmenting path, updating the potentials."""
+        rows, u, v, p = self.rows, self.u, self.v, self.p
+        m = self.m
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        way = [0] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = rows[i0 - 1]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Flip the matching along the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+        p[0] = 0
@@ -1,101 +1,241 @@
-import numpy as np
+from array import array
 from math import inf
+from SokobanPuzzle import cells_of, ACTIONS, ACTION_INDEX, OPPOSITE
+from Matching import Assignment, INF_COST
+
+MACRO_SHIFT = 32  # Action codes of macro pushes hold (destination cell + 1) from this bit up
+CELL_MASK = (1 << (MACRO_SHIFT - 2)) - 1  # Bits of the pushed box's cell + 1 in an action code
+
+
+class NodePool:
+    """Array-backed search tree: the parent index and action code of every node, by node index.
+
+    An action code is the direction index, plus (box cell + 1) << 2 when the
+    action pushed a box, plus (destination + 1) << MACRO_SHIFT when a macro
+    push took the box further than the next cell (the direction is then the
+    last push's), so a path can be replayed from the root state.
+    """
+    def __init__(self, root):
+        self.root = root.copy()  # Initial state, replayed to rebuild paths
+        self.parents = array('q', [-1])
+        self.codes = array('q', [-1])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def add(self, parent, code):
+        """Record a child of node index parent and return its index."""
+        self.parents.append(parent)
+        self.codes.append(code)
+        return len(self.codes) - 1
+
+    def path(self, index):
+        """Return the action codes from the root to node index."""
+        codes = []
+        while index > 0:
+            codes.append(self.codes[index])
+            index = self.parents[index]
+        return codes[::-1]
+
+    def states(self, index):
+        """Yield the state before the first action and after every action on the path to node index."""
+        state = self.root.copy()
+        yield state.copy()
+        for code in self.path(index):
+            for action in NodePool.expand(state, code):
+                state.apply(action)
+            yield state.copy()
+
+    @staticmethod
+    def expand(state, code):
+        """Return the moves playing action code from state: the walk to the pushed box, if any, then the action."""
+        d = code & 3
+        if code >> MACRO_SHIFT:  # A macro push, replayed with the fewest pushes
+            return state.push_path((code >> 2 & CELL_MASK) - 1, (code >> MACRO_SHIFT) - 1, d)
+        if code >> 2:  # A box was pushed from cell (code >> 2) - 1
+            stand = state.level.step[OPPOSITE[d]][(code >> 2) - 1]
+            return state.walk_path(stand) + ACTIONS[d]
+        return ACTIONS[d]
+
 
 class Node:
+    __slots__ = ('state', 'pool', 'index', 'g', 'depth', 'h', 'heuristic', 'storage_distance', 'matching', 'hint')
+
     def __init__(self, sokobanPuzzle, parent=None, action="", g=1):
         self.state = sokobanPuzzle  
-        self.parent = parent
-        self.action = action
         self.g = g if parent is None else parent.g + g
         self.depth = 0 if parent is None else parent.depth + 1
-        self.moves = "" if parent is None else parent.moves + action
-        self.tab_stat = self.state.grid
+        self.h = None  # Value of heuristic number self.heuristic, evaluated once
+        self.heuristic = None
+        self.storage_distance = None  # Box-to-nearest-free-storage distance sum of heuristic2/3
+        self.matching = None  # Box-to-target Assignment of heuristic4
+        self.hint = None  # (boxes, storage_distance, matching) of the parent, to update the heuristics incrementally
+
+        if parent is None:
+            self.pool = NodePool(sokobanPuzzle)  # A new search tree rooted here
+            self.index = 0
+            return
+
+        # Only the parent's index and the action code are kept: the path is rebuilt from the pool
+        code = ACTION_INDEX[action]
+        moved = parent.state.boxes & ~sokobanPuzzle.boxes
+        if moved:
+            code |= moved.bit_length() << 2  # (box cell + 1) << 2
+            if g > 1:  # A macro push, g counting its pushes: keep where the box ended
+                code |= (sokobanPuzzle.boxes & ~parent.state.boxes).bit_length() << MACRO_SHIFT
+        self.pool = parent.pool
+        self.index = parent.pool.add(parent.index, code)
+        if parent.storage_distance is not None or parent.matching is not None:
+            self.hint = (parent.state.boxes, parent.storage_distance, parent.matching)
+
+    @property
+    def action(self):
+        """Action leading to this node ("" for the root)."""
+        return ACTIONS[self.pool.codes[self.index] & 3] if self.index else ""
+
+    @property
+    def moves(self):
+        """Actions from the initial state to this node, as a string."""
+        return "".join(self.get_solution())
+
+    @property
+    def tab_stat(self):
+        """Walls and targets, shared by every node of the level."""
+        return self.state.level.static_grid
+
+    def succ(self, pushes=False, macros=False):
+        """Returns the child nodes reached by every valid move, or by every reachable (macro) push.
+
+        A macro push costs the number of pushes it stands for.
+        """
+        if pushes:
+            return [Node(state, self, action, count) for action, state, count in self.state.push_succ(macros)]
+        return [Node(state, self, action) for action, state in self.state.succ()]
+
+    def expand_pushes(self):
+        """Rebuilds the full move string of a push-level path, walking the robot between pushes."""
+        state = self.pool.root.copy()
+        moves = []
+        for code in self.pool.path(self.index):
+            step = NodePool.expand(state, code)
+            for action in step:
+                state.apply(action)
+            moves.append(step)
+        return "".join(moves)
 
     def costHeur(self, heuristique):
         """Calculates the cost based on the selected heuristic."""
         return self.f(heuristique)  # Assuming f() computes the cost
     def get_path(self):
         """Returns a list of states representing the path from the initial state to the current node."""
-        path = []
-        node = self
-        while node is not None:
-            path.append(node.state.grid)  # Use the current state grid instead of tab_dyn
-            node = node.parent
-        return path[::-1]  # Return the path from initial state to goal
+        return [state.grid for state in self.pool.states(self.index)]  # Replayed from the pool's root
 
     def f(self, heuristic=1): 
         """Calculates the cost of the current node using the selected heuristic."""
-        heuristics = {
-            1: self.heuristic1(),
-            2: self.heuristic2(),
-            3: self.heuristic3()
-        }
-        return self.g + heuristics[heuristic]  # Total cost = g + heuristic
+        if self.heuristic != heuristic:  # The heuristic is evaluated once per node
+            self.h = Node.heuristics[heuristic](self)
+            self.heuristic = heuristic
+            self.hint = None  # The parent's data is no longer needed
+        return self.g + self.h  # Total cost = g + heuristic
 
     def heuristic1(self):
         """First heuristic: Number of left storage cells."""
-        tab_stat = self.tab_stat  # Use instance variable instead of class variable
-        S_indices_x, S_indices_y = np.where(tab_stat == 'S')  # Storage indices
-        
-        left_storage = len(S_indices_x)  # Total storage cells
-        for ind_x, ind_y in zip(S_indices_x, S_indices_y):
-            if self.state.grid[ind_x][ind_y] == 'B':  # If occupied by a box
-                left_storage -= 1
-
-        return left_storage
+        level = self.state.level
+        return (level.target_mask & ~self.state.boxes).bit_count()
 
     def heuristic2(self):
         """Second heuristic: 2 * Number of left storage + Min Manhattan distance to storage goals."""
-        tab_stat = self.tab_stat  # Use instance variable instead of class variable
-        S_indices_x, S_indices_y = np.where(tab_stat == 'S')
-        tab_dyn = np.array(self.state.grid)  # Current dynamic state
-        B_indices_x, B_indices_y = np.where(tab_dyn == 'B')
-
-        sum_distance = 0
-        storage_left = len(S_indices_x)
-        for b_ind_x, b_ind_y in zip(B_indices_x, B_indices_y):
-            min_distance = inf
-            for s_ind_x, s_ind_y in zip(S_indices_x, S_indices_y):
-                distance = abs(b_ind_x - s_ind_x) + abs(b_ind_y - s_ind_y)
-                if distance == 0: storage_left -= 1  # If box is on storage
-                if distance < min_distance:
-                    min_distance = distance
-            sum_distance += min_distance
-        
-        return sum_distance + 2 * storage_left
+        level = self.state.level
+        return self.storageDistance() + 2 * (level.target_mask & ~self.state.boxes).bit_count()
 
     def heuristic3(self):
         """Third heuristic: Min Manhattan distances from blocks to storage + robot to blocks + 2 * Number of left storage."""
-        tab_stat = self.tab_stat  # Use instance variable instead of class variable
-        S_indices_x, S_indices_y = np.where(tab_stat == 'S')
-        tab_dyn = np.array(self.state.grid)  # Current dynamic state
-        B_indices_x, B_indices_y = np.where(tab_dyn == 'B')
-
-        sum_distance = 0
-        storage_left = len(S_indices_x)
-        min_distance_br = inf
-        
-        for b_ind_x, b_ind_y in zip(B_indices_x, B_indices_y):
-            # Distance from box to robot
-            distance_br = abs(b_ind_x - self.state.robot_position[0]) + abs(b_ind_y - self.state.robot_position[1])
-            if distance_br < min_distance_br:
+        level = self.state.level
+        robot_x, robot_y = self.state.robot_position
+
+        # Distance from the robot to the nearest box off storage
+        min_distance_br = 0
+        for cell in cells_of(self.state.boxes & ~level.target_mask):
+            b_ind_x, b_ind_y = level.position(cell)
+            distance_br = abs(b_ind_x - robot_x) + abs(b_ind_y - robot_y)
+            if min_distance_br == 0 or distance_br < min_distance_br:
                 min_distance_br = distance_br
 
-            # Distance from box to nearest storage
-            min_distance = inf
-            for s_ind_x, s_ind_y in zip(S_indices_x, S_indices_y):
-                distance = abs(b_ind_x - s_ind_x) + abs(b_ind_y - s_ind_y)
-                if distance == 0: storage_left -= 1  # If box is on storage
-                if distance < min_distance:
-                    min_distance = distance
-            sum_distance += min_distance
-            
-        return sum_distance + min_distance_br + 2 * storage_left
-    def get_solution(self):  # Line 93
-     """Returns the solution to the search problem as a list of moves."""  # Indented
-     node = self
-     solution = []
-     while node:
-        solution.append(node.action)  # Store action leading to this node
-        node = node.parent
-     return solution[::-1]  # Reverse to get actions from start to goal
+        return self.storageDistance() + min_distance_br + 2 * (level.target_mask & ~self.state.boxes).bit_count()
+
+    def storageDistance(self):
+        """Sum over boxes off storage of the Manhattan distance to the nearest free storage.
+
+        Derived from the parent's sum when the set of free storage cells is the
+        same, since then only the box that moved changes its term.
+        """
+        if self.storage_distance is not None:
+            return self.storage_distance
+
+        level = self.state.level
+        boxes = self.state.boxes
+        storage = level.target_mask & ~boxes  # Free storage
+        hint = self.hint
+        if hint is not None and hint[1] is not None and storage == level.target_mask & ~hint[0]:
+            moved = boxes ^ hint[0]
+            self.storage_distance = hint[1]
+            if moved:  # Both cells are off storage, or the free storage would have changed
+                old_cell = (moved & hint[0]).bit_length() - 1
+                new_cell = (moved & boxes).bit_length() - 1
+                self.storage_distance += self._nearestStorage(new_cell, storage) - self._nearestStorage(old_cell, storage)
+        else:
+            self.storage_distance = sum(self._nearestStorage(cell, storage) for cell in cells_of(boxes & ~level.target_mask))
+        return self.storage_distance
+
+    def _nearestStorage(self, cell, storage):
+        """Manhattan distance from cell to the nearest cell of the storage bitboard."""
+        level = self.state.level
+        b_ind_x, b_ind_y = level.position(cell)
+        min_distance = inf
+        for s_cell in cells_of(storage):
+            s_ind_x, s_ind_y = level.position(s_cell)
+            distance = abs(b_ind_x - s_ind_x) + abs(b_ind_y - s_ind_y)
+            if distance < min_distance:
+                min_distance = distance
+        return 0 if min_distance == inf else min_distance  # No free storage left (more boxes than storage)
+
+    def heuristic4(self):
+        """Fourth heuristic: Minimum-cost matching of boxes to targets on true push distances."""
+        level = self.state.level
+        boxes = self.state.boxes
+        if boxes.bit_count() > len(level.target_cells):
+            # More boxes than targets: match every target with a box instead (no incremental update)
+            cost = Assignment(zip(*[level.target_dist[cell] for cell in cells_of(boxes)])).cost
+            return inf if cost >= INF_COST else cost
+
+        hint = self.hint
+        moved = boxes ^ hint[0] if hint is not None else 0
+        if hint is not None and hint[2] is not None and moved.bit_count() in (0, 2):
+            # At most one box moved since the parent: update its matching with a single augmentation
+            self.matching = hint[2]
+            if moved:
+                old_cell = (moved & hint[0]).bit_length() - 1
+                new_cell = (moved & boxes).bit_length() - 1
+                self.matching = self.matching.copy()
+                self.matching.replace(old_cell, new_cell, level.target_dist[new_cell])
+        else:
+            cells = list(cells_of(boxes))
+            self.matching = Assignment([level.target_dist[cell] for cell in cells], cells)
+
+        # A box that cannot reach any free target makes the state a deadlock
+        return inf if self.matching.cost >= INF_COST else self.matching.cost
+
+    heuristics = {1: heuristic1, 2: heuristic2, 3: heuristic3, 4: heuristic4}
+    admissible = {1, 4}  # Heuristics that never overestimate (and are consistent), so cost bounds can be proven
+
+    @staticmethod
+    def estimate(sokobanPuzzle, heuristic=1):
+        """Evaluates a heuristic from scratch on a puzzle state, without building a node or a pool."""
+        node = Node.__new__(Node)
+        node.state = sokobanPuzzle
+        node.storage_distance = node.matching = node.hint = None
+        return Node.heuristics[heuristic](node)
+
+    def get_solution(self):
+        """Returns the solution to the search problem as a list of moves."""
+        return [ACTIONS[code & 3] for code in self.pool.path(self.index)]  # Rebuilt from the pool's parent indices
@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+from collections import deque
+from hashlib import blake2b
+from SokobanPuzzle import SokobanPuzzle, cells_of
+
+
+class PatternStore:
+    """Deadlock patterns of a level: small groups of boxes proven unable to all reach targets.
+
+    When a push leaves the pushed box next to other boxes, the group of
+    boxes around it (at most max_boxes) is checked by a sub-search with only
+    those boxes on the board, from every region the robot could be in. A
+    group that can never be solved is a dead pattern: any state holding it
+    is a deadlock, whatever the other boxes do. Patterns are indexed by their
+    cells, so matching a push only scans the few patterns holding the pushed
+    box. Groups proven solvable are remembered too, so nothing is proven
+    twice, and both can be saved to a folder shared by later runs, one JSON
+    file per level. Groups whose sub-search ran out of budget are only
+    skipped for the rest of this run.
+    """
+    def __init__(self, level, path=None, max_boxes=3, budget=2000):
+        self.level = level
+        self.path = path  # Folder of one pattern file per level, loaded now and written by save()
+        self.max_boxes = max_boxes  # Largest group checked by a sub-search
+        self.budget = budget  # States a sub-search may expand before the group is left unproven
+        self.by_cell = [[] for _ in range(level.size)]  # Dead patterns (bitboards) holding each cell
+        self.dead = set()
+        self.known = set()  # Groups proven solvable
+        self.unproven = set()  # Groups whose sub-search ran out of budget, never saved
+        self.learned = 0  # Dead patterns found by this store's sub-searches
+        self.proving = False  # Set during a sub-search: match, but do not start another one
+
+        # Cells around each cell (the 3x3 block), the boxes a group is made of
+        self.window = []
+        for cell in range(level.size):
+            r, c = level.position(cell)
+            mask = 0
+            for nr in (r - 1, r, r + 1):
+                for nc in (c - 1, c, c + 1):
+                    if 0 <= nr < level.rows and 0 <= nc < level.cols and not level.walls[nr * level.cols + nc]:
+                        mask |= 1 << (nr * level.cols + nc)
+            self.window.append(mask)
+
+        if path is not None and os.path.exists(self.file(path)):
+            self.load(path)
+
+    @property
+    def key(self):
+        """Name of the level's pattern file (a digest of its walls and targets)."""
+        level = self.level
+        return blake2b(b'%d,%d;' % (level.rows, level.cols) + level.cell_codes, digest_size=16).hexdigest()
+
+    def file(self, path):
+        """Path of the level's pattern file in the folder path."""
+        return os.path.join(path, self.key + '.json')
+
+    def add(self, pattern):
+        """Record a dead pattern."""
+        if pattern not in self.dead:
+            self.dead.add(pattern)
+            for cell in cells_of(pattern):
+                self.by_cell[cell].append(pattern)
+
+    def is_dead(self, boxes, cell):
+        """Return True if the boxes hold a dead pattern involving the box just pushed onto cell.
+
+        Learns the group of boxes around cell first if it was never checked.
+        """
+        if boxes.bit_count() > len(self.level.target_cells):
+            return False  # With spare boxes a group need not reach targets at all, so no pattern is dead
+        for pattern in self.by_cell[cell]:
+            if boxes & pattern == pattern:
+                return True
+        if self.proving:
+            return False
+        group = boxes & self.window[cell]
+        if not 2 <= group.bit_count() <= self.max_boxes or group in self.known or group in self.unproven:
+            return False
+        unsolvable = self._unsolvable(group)
+        if unsolvable:
+            self.add(group)
+            self.learned += 1
+            return True
+        (self.known if unsolvable is False else self.unproven).add(group)
+        return False
+
+    def _unsolvable(self, group):
+        """Sub-search: True if the boxes of group alone can never all stand on targets, wherever the robot is.
+
+        Returns False once they can, and None if the budget runs out first.
+        """
+        level = self.level
+        target_mask = level.target_mask
+        if group & ~target_mask == 0:
+            return False
+        deadlocks = level.deadlocks
+        counters = (deadlocks.pruned_dead, deadlocks.pruned_square, deadlocks.pruned_freeze, deadlocks.pruned_pattern)
+
+        # One start state per region of the robot around the group
+        queue = deque()
+        seen = set()
+        covered = group
+        for cell in range(level.size):
+            if level.walls[cell] or covered >> cell & 1:
+                continue
+            start = SokobanPuzzle.from_state(level, cell, group)
+            reach, _ = start.reachable()
+            covered |= sum(1 << reached for reached in range(level.size) if reach[reached])
+            seen.add(start.normalized_key())
+            queue.append(start)
+
+        self.proving = True
+        try:
+            expanded = 0
+            while queue:
+                expanded += 1
+                if expanded > self.budget:
+                    return None  # Not proven either way: treat as solvable, but do not store it
+                state = queue.popleft()
+                for _, child, _ in state.push_succ():
+                    if child.boxes & ~target_mask == 0:
+                        return False
+                    key = child.normalized_key()
+                    if key not in seen:
+                        seen.add(key)
+                        queue.append(child)
+            return True
+        finally:
+            self.proving = False
+            (deadlocks.pruned_dead, deadlocks.pruned_square,
+             deadlocks.pruned_freeze, deadlocks.pruned_pattern) = counters  # Only the main search's pruning counts
+
+    def load(self, path):
+        """Merge the patterns stored for this level in the pattern folder path."""
+        with open(self.file(path)) as stored:
+            entry = json.load(stored)
+        for pattern in entry.get('dead', ()):
+            self.add(sum(1 << cell for cell in pattern))
+        self.known.update(sum(1 << cell for cell in group) for group in entry.get('known', ()))
+
+    def save(self, path=None):
+        """Write this level's patterns into its file in the pattern folder, keeping what other runs stored there.
+
+        The read-merge-write holds an exclusive lock on the folder's .lock
+        file, so workers saving the same level at once never drop each
+        other's patterns. Only this level's file is read and rewritten.
+        """
+        import fcntl  # POSIX only, so importing the module does not need it
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        file = self.file(path)
+        with open(os.path.join(path, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the lock file is closed
+            entry = {'dead': [], 'known': []}
+            if os.path.exists(file):
+                with open(file) as stored:
+                    entry = json.load(stored)
+            dead = {frozenset(pattern) for pattern in entry['dead']} | {frozenset(cells_of(p)) for p in self.dead}
+            known = {frozenset(group) for group in entry['known']} | {frozenset(cells_of(g)) for g in self.known}
+            entry['dead'] = sorted(sorted(pattern) for pattern in dead)
+            entry['known'] = sorted(sorted(group) for group in known)
+            # Write a new file and swap it in, so a reader never sees half a file
+            handle, temporary = tempfile.mkstemp(dir=path, suffix='.tmp')
+            with os.fdopen(handle, 'w') as out:
+                json.dump(entry, out)
+            os.replace(temporary, file)
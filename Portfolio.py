@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Node import Node
+from Search import Search, SearchObserver, SearchStats
+from SokobanPuzzle import SokobanPuzzle
+
+# Search configurations raced by default, one per worker process
+DEFAULT_PORTFOLIO = (
+    {'name': 'astar-h1', 'method': 'astar', 'heuristic': 1},
+    {'name': 'astar-h2', 'method': 'astar', 'heuristic': 2},
+    {'name': 'astar-h3', 'method': 'astar', 'heuristic': 3},
+    {'name': 'astar-h4', 'method': 'astar', 'heuristic': 4},
+    {'name': 'astar-h4-pushes', 'method': 'astar', 'heuristic': 4, 'pushes': True},
+    {'name': 'astar-h4-macros', 'method': 'astar', 'heuristic': 4, 'pushes': True, 'macros': True},
+    {'name': 'wastar-h4-w3', 'method': 'astar', 'heuristic': 4, 'weight': 3},
+    {'name': 'anytime-h4', 'method': 'anytime', 'heuristic': 4, 'weight': 5},
+    {'name': 'bfs', 'method': 'bfs'},
+    {'name': 'bidirectional', 'method': 'bidirectional'},
+    {'name': 'beam-1000', 'method': 'batch', 'beam_width': 1000},
+    {'name': 'idastar-h4', 'method': 'idastar', 'heuristic': 4, 'table_size': 1 << 20},
+)
+
+
+def run_config(puzzle, config, stats=None, observer=None, cache=None):
+    """Solve puzzle with one search configuration and return a result dict (moves is None if unsolved).
+
+    An optional Search.SearchObserver receives progress and can stop the search early,
+    and an optional SolutionCache is consulted before searching and filled afterwards.
+    bound is the proven suboptimality bound of an A* solution (None when unknown).
+    """
+    method = config.get('method', 'astar')
+    heuristic = config.get('heuristic', 1)
+    pushes = config.get('pushes', False)
+    macros = config.get('macros', False)  # Tunnel and goal-room macro pushes, push-level searches only
+    stats = stats if stats is not None else SearchStats()
+    start = time.perf_counter()
+
+    root = Node(puzzle)
+    if method == 'astar':
+        node, steps = Search.Astar(root, heuristic, pushes=pushes, weight=config.get('weight', 1), stats=stats,
+                                   observer=observer, cache=cache, macros=macros)
+    elif method == 'anytime':
+        node, steps = Search.anytimeAstar(root, heuristic, weight=config.get('weight', 5), pushes=pushes,
+                                          time_budget=config.get('time_budget'), stats=stats, observer=observer)
+    elif method == 'bfs':
+        node, steps = Search.breadthFirst(root, stats, pushes=pushes, observer=observer, cache=cache,
+                                          macros=macros)
+    elif method == 'external':
+        node, steps = Search.externalBreadthFirst(root, stats, pushes=pushes, directory=config.get('directory'),
+                                                  observer=observer)
+    elif method == 'batch':
+        node, steps = Search.batchBreadthFirst(root, stats, beam_width=config.get('beam_width'), observer=observer,
+                                               cache=cache)
+    elif method == 'bidirectional':
+        node, steps = Search.bidirectional(root, stats, observer=observer, cache=cache)
+    elif method == 'idastar':
+        node, steps = Search.idaStar(root, heuristic, table_size=config.get('table_size', 0), stats=stats,
+                                     observer=observer, cache=cache)
+    else:
+        raise ValueError(f"Unknown search method: {method}")
+
+    moves = bound = None
+    if node is not None:
+        moves = node.expand_pushes() if pushes else node.moves
+        if method == 'anytime':
+            bound = stats.solutions[-1]['bound']
+        elif method == 'astar' and heuristic in Node.admissible and not macros:
+            bound = config.get('weight', 1)
+    return {
+        'config': config.get('name', method),
+        'moves': moves,
+        'pushes': count_pushes(puzzle, moves) if moves is not None else None,
+        'steps': steps,
+        'bound': bound,
+        'time': time.perf_counter() - start,
+    }
+
+
+def count_pushes(puzzle, moves):
+    """Count the moves of a solution that push a box; puzzle is left unchanged."""
+    tokens = [puzzle.apply(action) for action in moves]
+    for token in reversed(tokens):
+        puzzle.undo(token)
+    return sum(1 for token in tokens if token & 4)
+
+
+_stop = None  # Event shared with solve() in every worker process, set to cancel the searches still running
+
+
+def _init_worker(stop):
+    """Worker initializer: keep the shared stop event."""
+    global _stop
+    _stop = stop
+
+
+def _solve_in_worker(grid, robot_position, config):
+    """Worker process entry point: build the puzzle locally and run one configuration until it is stopped."""
+    observer = SearchObserver(interval=0, cancel_event=_stop)
+    return run_config(SokobanPuzzle(grid, robot_position), config, observer=observer)
+
+
+def solve(grid, robot_position=None, configs=DEFAULT_PORTFOLIO, time_budget=None, best=False, workers=None):
+    """Race several search configurations on a level, one process each.
+
+    Returns the first solution found, or with best=True the shortest one
+    found before every configuration finished or time_budget (seconds)
+    ran out. Returns None if no configuration found a solution in time.
+    Configurations still running when the answer is known are cancelled.
+    """
+    grid = [list(row) for row in grid]  # Plain lists pickle cheaply to the workers
+    workers = workers or min(len(configs), os.cpu_count() or 1)
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    found = None
+
+    stop = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stop,))
+    try:
+        pending = {executor.submit(_solve_in_worker, grid, robot_position, config) for config in configs}
+        while pending:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:  # Time budget exhausted
+                break
+            for future in done:
+                result = future.result()
+                if result['moves'] is None:
+                    continue
+                if found is None or len(result['moves']) < len(found['moves']):
+                    found = result
+            if found is not None and not best:
+                break
+    finally:
+        # Drop queued configurations; running searches see the event at their next check and return
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return found
@@ -1,96 +1,828 @@
+import json
+import numpy as np
+from Batch import BatchEngine
+from External import SortedRuns, RECORD
 from Node import *
+from SokobanPuzzle import SokobanPuzzle, ACTIONS, ACTION_INDEX, OPPOSITE
 from collections import deque
-from tkinter import *
+from heapq import heappush, heappop, heapify
+from itertools import count
+from sys import getsizeof
+from time import perf_counter
+
+class SearchStats:
+    """Counters filled in by a search when it is given a stats object."""
+    def __init__(self, timing=False, memory=False):
+        self.expanded = 0  # Nodes taken out of OPEN and expanded
+        self.generated = 0  # Child nodes produced by the successor function
+        self.duplicates = 0  # Children dropped because their state was already seen
+        self.peak_frontier = 0  # Largest number of nodes held in OPEN at once
+        self.peak_frontier_bytes = 0  # Largest memory held by the nodes in OPEN (measured with memory set)
+        self.visited = 0  # Number of distinct states seen
+        self.visited_bytes = 0  # Memory held by the visited table at the end of the search (measured with memory set)
+        self.timing = timing  # Whether the search also times its phases (adds clock calls to the loop)
+        self.memory = memory  # Whether the search also measures OPEN and the visited table (adds getsizeof calls)
+        self.time_successors = 0.0  # Seconds spent generating successors
+        self.time_heuristic = 0.0  # Seconds spent evaluating the heuristic
+        self.time_bookkeeping = 0.0  # Seconds spent on OPEN/CLOSED and duplicate checks
+        self.solutions = []  # Every solution an anytime search reported: cost, weight, bound, expanded, time
+
+
+class SearchObserver:
+    """Receives live progress from a running search and decides when it has to stop.
+
+    Every interval seconds a report (a dict of expanded, generated, duplicates,
+    pruned by deadlock, open size, current bound and nodes/sec since the last
+    report) is passed to callback and/or written as a JSON line to log.
+    The search gives up and returns (None, -1) once cancel() was called,
+    time_budget seconds passed or node_budget nodes were expanded; stopped
+    then holds the reason ('cancelled', 'time' or 'nodes'). Setting
+    cancel_event (e.g. a multiprocessing.Event shared with another process)
+    cancels the search too.
+    """
+    def __init__(self, interval=1.0, callback=None, log=None, time_budget=None, node_budget=None, check_every=256,
+                 cancel_event=None):
+        self.interval = interval  # Seconds between two reports (0 or None for no periodic report)
+        self.callback = callback  # Called with every report
+        self.log = log  # Text file every report is written to
+        self.time_budget = time_budget  # Seconds the search may run
+        self.node_budget = node_budget  # Nodes the search may expand
+        self.check_every = check_every  # Expansions between two clock reads, keeps the loop cheap
+        self.cancelled = False
+        self.cancel_event = cancel_event  # Checked with the clock, like cancelled
+        self.stopped = None  # Why the search was stopped, None while it may run
+        self.last_report = None
+
+    def cancel(self):
+        """Ask the search to stop at its next check; safe to call from another thread or a signal handler."""
+        self.cancelled = True
+
+    def start(self, level):
+        """Called by the search before its first expansion."""
+        self.level = level
+        self.stopped = None
+        self._pruned = level.deadlocks.pruned  # The detector counts over its lifetime, report this search only
+        self._started = self._last_time = perf_counter()
+        self._last_step = 0
+        self._next_check = self.check_every  # Step of the next clock read, steps may jump by a whole layer
+        self._next_report = self._started + self.interval if self.interval else inf
+
+    def tick(self, stats, step, open_size, bound):
+        """Called by the search after every expansion (or layer); returns True when the search has to stop."""
+        if self.node_budget is not None and step >= self.node_budget:
+            self.stopped = 'nodes'
+        elif step < self._next_check:
+            return False
+        elif self.cancelled or self.cancel_event is not None and self.cancel_event.is_set():
+            self.stopped = 'cancelled'
+        self._next_check = step + self.check_every
+        now = perf_counter()
+        if self.stopped is None and self.time_budget is not None and now - self._started >= self.time_budget:
+            self.stopped = 'time'
+        if self.stopped is not None or now >= self._next_report:
+            self.emit(self.report(stats, step, open_size, bound, now))
+            self._next_report = now + self.interval if self.interval else inf
+        return self.stopped is not None
+
+    def report(self, stats, step, open_size, bound, now):
+        """Build the progress report of the search at time now."""
+        elapsed = now - self._last_time
+        rate = round((step - self._last_step) / elapsed) if elapsed > 0 else 0
+        self._last_time, self._last_step = now, step
+        return {
+            'elapsed': round(now - self._started, 3),
+            'expanded': step,
+            'generated': stats.generated,
+            'duplicates': stats.duplicates,
+            'pruned': self.level.deadlocks.pruned - self._pruned,
+            'open': open_size,
+            'bound': bound,
+            'nodes_per_second': rate,
+            'stopped': self.stopped,
+        }
+
+    def emit(self, report):
+        """Hand a report to the callback and the log."""
+        self.last_report = report
+        if self.callback is not None:
+            self.callback(report)
+        if self.log is not None:
+            self.log.write(json.dumps(report) + '\n')
+            self.log.flush()
+
 
 class Search:  # Search class
 
+    @staticmethod
+    def nodeBytes(node):
+        """Approximate memory held by one node and its state, in bytes."""
+        state = node.state
+        pool = node.pool
+        pool_entry = pool.parents.itemsize + pool.codes.itemsize  # Path storage in the node pool
+        return getsizeof(node) + pool_entry + getsizeof(state) + getsizeof(state.boxes) + getsizeof(state.hash)
+
+    @staticmethod
+    def tableBytes(table):
+        """Approximate memory held by a set of state keys, in bytes."""
+        size = getsizeof(table)
+        for key in table:
+            size += getsizeof(key)
+            if isinstance(key, tuple):  # Composite keys also own their parts
+                size += sum(getsizeof(part) for part in key)
+        return size
+
     @staticmethod  # BFS search algorithm 
-    def breadthFirst(initial_node):  # initial_node is a Node object representing the initial state of the puzzle
-        
+    def breadthFirst(initial_node, stats=None, pushes=False, observer=None, cache=None, macros=False):  # initial_node is a Node object representing the initial state of the puzzle
+        """With pushes=True nodes are box pushes (rebuild moves with Node.expand_pushes) and the result is push-optimal.
+
+        With macros (push-level only) tunnel and goal-room macro pushes are single
+        nodes: far fewer nodes, but the result is no longer push-optimal.
+        An observer gets progress reports (its bound is the current depth) and may stop the search.
+        A SolutionCache is consulted first (a hit returns 0 nodes expanded) and filled with the solution found.
+        """
+        stats = stats if stats is not None else SearchStats()
+        memory = stats.memory  # Frontier bytes cost five getsizeof calls per node, only paid when asked for
+        key_of = Search.stateKey(pushes)
+        variant = f"bfs/{'pushes' if pushes else 'moves'}{'/macros' if macros else ''}"
+        cached = Search._cached(cache, initial_node, variant, pushes)
+        if cached is not None:
+            return cached, 0
+        if observer is not None:
+            observer.start(initial_node.state.level)
+
         # Check if the start element is the goal
-        if initial_node.state.is_goal(Node.tab_stat):  # Corrected method name
+        if initial_node.state.is_goal():
             return initial_node, 0  # Return the initial node and the number of nodes expanded
 
-        # Create the OPEN FIFO queue and the CLOSED list
+        # Create the OPEN FIFO queue and the set of visited state keys
         open = deque([initial_node])  # A FIFO queue of Node objects
-        closed = []  # A list of Node objects 
-        
+        visited = {key_of(initial_node.state)}  # Keys of every state already queued or expanded
+        frontier_bytes = Search.nodeBytes(initial_node) if memory else 0  # Memory held by the nodes in OPEN
+        stats.peak_frontier, stats.peak_frontier_bytes = 1, frontier_bytes
+
         step = 0  # Number of nodes expanded
-        while True:  # Loop until the goal is found or the OPEN queue is empty
-            step += 1  # Increment the number of nodes expanded
-            
-            # Check if the OPEN queue is empty => goal not found 
-            if len(open) == 0:  # If the OPEN queue is empty
-                return None, -1  # Return None and -1
-            
+        while open:  # Loop until the goal is found or the OPEN queue is empty
             # Get the first element of the OPEN queue
             current = open.popleft()  # current is a Node object
-            closed.append(current)  # current is a Node object                    
+            if memory:
+                frontier_bytes -= Search.nodeBytes(current)
+            step += 1  # Increment the number of nodes expanded
+            if observer is not None and observer.tick(stats, step, len(open), current.depth):
+                break  # Cancelled or out of budget
 
             # Generate the successors of the current node
-            succ = current.succ()  # Ensure this is a deque
-            for child in succ:  # Use a for loop to iterate over successors
-                # Check if the child is not in the OPEN queue and the CLOSED list
-                if (child.state.tab_dyn not in [n.state.tab_dyn for n in closed] and 
-                    child.state.tab_dyn not in [n.state.tab_dyn for n in open]): 
+            for child in current.succ(pushes, macros):
+                stats.generated += 1
+                key = key_of(child.state)
+                if key in visited:  # Already queued or expanded
+                    stats.duplicates += 1
+                    continue
+                visited.add(key)
+
+                # Check if the child is the goal
+                if child.state.is_goal():
+                    Search._closeStats(stats, step, visited)
+                    return Search._remember(cache, initial_node, variant, pushes, child), step  # Return the child node and the number of nodes expanded
+
+                # Put the child in the OPEN queue
+                open.append(child)
+                if memory:
+                    frontier_bytes += Search.nodeBytes(child)
+
+            stats.peak_frontier = max(stats.peak_frontier, len(open))
+            if memory:
+                stats.peak_frontier_bytes = max(stats.peak_frontier_bytes, frontier_bytes + getsizeof(open))
+
+        # The OPEN queue is empty (or the observer stopped the search) => goal not found
+        Search._closeStats(stats, step, visited)
+        return None, -1
+
+    @staticmethod  # External-memory BFS
+    def externalBreadthFirst(initial_node, stats=None, pushes=False, directory=None, merge_runs=8, observer=None):
+        """Breadth-first search whose visited set lives on disk, for searches too large for RAM.
+
+        The search goes one layer at a time. Only the layer being expanded and
+        the next one are held in RAM; every state seen is a (key, parent key,
+        action) record in sorted run files under directory (a temporary
+        folder by default) that are memory-mapped and merged in the background
+        of the search (see External.SortedRuns). Duplicates are removed late,
+        once per layer: the whole next layer is deduplicated and checked
+        against the runs in one batch. The solution path is rebuilt by looking
+        the parent keys up in the runs. With pushes=True nodes are box pushes.
+        """
+        stats = stats if stats is not None else SearchStats()
+        key_of = Search.stateKey(pushes)
+        if initial_node.state.is_goal():
+            return initial_node, 0
+        if observer is not None:
+            observer.start(initial_node.state.level)
 
-                    # Put the child in the OPEN queue 
-                    open.append(child)  # child is a Node object  
+        with SortedRuns(directory, merge_runs) as visited:
+            root_key = key_of(initial_node.state)
+            visited.add(np.array([(root_key, root_key, -1)], dtype=RECORD))
+            layer = [initial_node.state]
+            step = 0
+            depth = 0
+            while layer:
+                # Expand the whole layer, keeping the children's records and states in RAM
+                keys, parents, codes, states = [], [], [], []
+                for position, state in enumerate(layer):
+                    step += 1
+                    if observer is not None and observer.tick(stats, step, len(layer) - position + len(states), depth):
+                        Search._closeExternalStats(stats, step, visited)
+                        return None, -1  # Cancelled or out of budget
+                    parent_key = key_of(state)
+                    successors = state.push_succ() if pushes else state.succ()
+                    stats.generated += len(successors)
+                    for action, child, *_ in successors:
+                        code = ACTION_INDEX[action] | (state.boxes & ~child.boxes).bit_length() << 2
+                        if child.is_goal():
+                            path = Search._externalPath(visited, parent_key) + [code]
+                            Search._closeExternalStats(stats, step, visited)
+                            return Search._replayCodes(initial_node, path), step
+                        keys.append(key_of(child))
+                        parents.append(parent_key)
+                        codes.append(code)
+                        states.append(child)
+                layer = None  # The expanded layer is no longer needed
 
-                    # Check if the child is the goal
-                    if child.state.is_goal(Node.tab_stat):  # Corrected method name
-                        return child, step  # Return the child node and the number of nodes expanded 
+                # Delayed duplicate detection: inside the new layer, then against every state on disk
+                records = np.empty(len(keys), dtype=RECORD)
+                records['key'], records['parent'], records['code'] = keys, parents, codes
+                _, first = np.unique(records['key'], return_index=True)  # Sorted unique keys
+                fresh = first[~visited.contains(records['key'][first])]
+                stats.duplicates += len(keys) - len(fresh)
+                visited.add(records[fresh])
+                layer = [states[i] for i in fresh.tolist()]
+                depth += 1
+                stats.peak_frontier = max(stats.peak_frontier, len(layer))
+
+            # No layer left => goal not found
+            Search._closeExternalStats(stats, step, visited)
+            return None, -1
+
+    @staticmethod
+    def _closeExternalStats(stats, step, visited):
+        """Record the final counters of an external-memory search."""
+        stats.expanded = step
+        stats.visited = len(visited)
+        stats.visited_bytes = visited.bytes
+
+    @staticmethod
+    def _externalPath(visited, key):
+        """Return the action codes from the root to the state key, following parent keys through the runs."""
+        codes = []
+        record = visited.lookup(key)
+        while record['code'] >= 0:
+            codes.append(int(record['code']))
+            record = visited.lookup(record['parent'])
+        return codes[::-1]
+
+    @staticmethod
+    def _replayCodes(init_node, codes):
+        """Rebuild the chain of (move-level) nodes for a list of action codes played from init_node."""
+        state = init_node.state.copy()
+        moves = []
+        for code in codes:
+            moves.append(NodePool.expand(state, code))
+            for action in moves[-1]:
+                state.apply(action)
+        return Search._replay(init_node, "".join(moves))
+
+    @staticmethod  # Vectorized layered search
+    def batchBreadthFirst(initial_node, stats=None, beam_width=None, observer=None, cache=None):
+        """Move-level breadth-first search expanding a whole layer at once with NumPy (see Batch.BatchEngine).
+
+        Moves, pushes, dead-cell pruning, Zobrist keys, goal tests and duplicate
+        removal are array operations over the layer; only the parent row and
+        direction of each state are kept per layer to rebuild the path. The
+        freeze, 2x2 and pattern deadlock checks are not vectorized and not run.
+        With beam_width only the beam_width states of each new layer with the
+        lowest BatchEngine.heuristic are kept (beam search): much less work,
+        but neither complete nor optimal.
+        An observer gets progress reports once per layer (its bound is the depth) and may stop the search.
+        """
+        stats = stats if stats is not None else SearchStats()
+        variant = 'bfs/moves' if beam_width is None else f'beam/w{beam_width}'  # Batch BFS is move-optimal like BFS
+        cached = Search._cached(cache, initial_node, variant, False)
+        if cached is not None:
+            return cached, 0
+        if observer is not None:
+            observer.start(initial_node.state.level)
+        if initial_node.state.is_goal():
+            return initial_node, 0
+
+        engine = BatchEngine(initial_node.state.level)
+        players, boxes = engine.layer(initial_node.state)
+        visited = engine.keys(players, boxes)  # Sorted keys of every state kept so far
+        history = []  # (parent rows, directions) of each layer after the root
+        step = 0
+        while len(players):
+            step += len(players)
+            if observer is not None and observer.tick(stats, step, len(players), len(history)):
+                break  # Cancelled or out of budget
+            players, boxes, parents, actions = engine.expand(players, boxes)
+            stats.generated += len(players)
+
+            # Duplicates inside the layer, then against every earlier layer
+            keys, first = np.unique(engine.keys(players, boxes), return_index=True)
+            position = np.minimum(np.searchsorted(visited, keys), len(visited) - 1)
+            fresh = visited[position] != keys
+            keys, first = keys[fresh], first[fresh]
+            stats.duplicates += len(players) - len(first)
+            players, boxes, parents, actions = players[first], boxes[first], parents[first], actions[first]
+
+            goals = np.flatnonzero(engine.is_goal(boxes))
+            if len(goals):
+                history.append((parents, actions))
+                Search._closeBatchStats(stats, step, visited)
+                node = Search._replay(initial_node, Search._batchPath(history, int(goals[0])))
+                return Search._remember(cache, initial_node, variant, False, node), step
+
+            if beam_width is not None and len(players) > beam_width:
+                keep = np.argpartition(engine.heuristic(boxes), beam_width)[:beam_width]
+                players, boxes, parents, actions, keys = players[keep], boxes[keep], parents[keep], actions[keep], keys[keep]
+            history.append((parents, actions))
+            visited = np.union1d(visited, keys)
+            stats.peak_frontier = max(stats.peak_frontier, len(players))
+            stats.peak_frontier_bytes = max(stats.peak_frontier_bytes, players.nbytes + boxes.nbytes)
+
+        # No layer left (or the observer stopped the search) => goal not found
+        Search._closeBatchStats(stats, step, visited)
+        return None, -1
+
+    @staticmethod
+    def _closeBatchStats(stats, step, visited):
+        """Record the final counters of a batch search."""
+        stats.expanded = step
+        stats.visited = len(visited)
+        stats.visited_bytes = visited.nbytes
+
+    @staticmethod
+    def _batchPath(history, row):
+        """Return the moves reaching the state on row of the last layer of a batch search."""
+        moves = []
+        for parents, actions in reversed(history):
+            moves.append(ACTIONS[actions[row]])
+            row = parents[row]
+        return "".join(reversed(moves))
+
+    @staticmethod
+    def _closeStats(stats, step, visited):
+        """Record the final counters of a search."""
+        stats.expanded = step
+        stats.visited = len(visited)
+        if stats.memory:
+            stats.visited_bytes = Search.tableBytes(visited)
+
+    @staticmethod
+    def stateKey(pushes):
+        """Return the function giving the table key of a state: push-level states key on the robot's region."""
+        return SokobanPuzzle.normalized_key if pushes else SokobanPuzzle.key
 
     @staticmethod  # A* algorithm
-    def Astar(init_node, heuristique=1):
+    def Astar(init_node, heuristique=1, pushes=False, weight=1, stats=None, observer=None, cache=None, macros=False):
+        """With pushes=True nodes are box pushes (rebuild moves with Node.expand_pushes) and g counts pushes.
+
+        With macros (push-level only) a box is taken through a whole tunnel or
+        into its goal-room target in one node, costing the pushes it stands for.
+        A weight above 1 orders OPEN by g + weight * h (weighted A*): solutions
+        come faster but may cost up to weight times the optimum.
+        If stats has timing set, the time spent generating successors,
+        evaluating the heuristic and maintaining OPEN/CLOSED is accumulated in it.
+        An observer gets progress reports (its bound is the f of the node expanded) and may stop the search.
+        A SolutionCache is consulted first (a hit returns 0 nodes expanded) and filled with the solution found.
+        """
+        stats = stats if stats is not None else SearchStats()
+        clock = perf_counter if stats.timing else None
+        key_of = Search.stateKey(pushes)
+        variant = f"astar/h{heuristique}/w{weight}/{'pushes' if pushes else 'moves'}{'/macros' if macros else ''}"
+        cached = Search._cached(cache, init_node, variant, pushes)
+        if cached is not None:
+            return cached, 0
+        if observer is not None:
+            observer.start(init_node.state.level)
         # Check if the start element is the goal
         if init_node.state.is_goal():  # Call without the grid argument
             return init_node, 0  # Return the initial node and the number of nodes expanded
 
+        # Create the OPEN priority queue (a binary heap of (f, tie, node, key)) and the CLOSED set
+        tie = count()  # Insertion order breaks ties between equal f values, nodes are never compared
         init_node.costHeur(heuristique)
-        # Create the OPEN priority queue and the CLOSED list
-        open = deque([init_node])  # A priority queue of Node objects
-        closed = list()  # A list of Node objects
+        init_key = key_of(init_node.state)
+        open = [(init_node.g + weight * init_node.h, next(tie), init_node, init_key)]
+        best_g = {init_key: init_node.g}  # Best known g per state key
+        closed = set()  # State keys of expanded nodes
         step = 0
 
-        while True:  # Loop until the goal is found or the OPEN queue is empty
-            step += 1  # Increment the number of nodes expanded
-            
-            # Check if the OPEN queue is empty => goal not found
-            if len(open) == 0:  # If the OPEN queue is empty
-                return None, -1  # Return None and -1
-            
-            # Sort the open list by the f value
-            open = deque(sorted(list(open), key=lambda node: node.f(heuristique)))
+        while open:  # Loop until the goal is found or the OPEN queue is empty
+            if clock:
+                started = clock()
+            f, _, current, key = heappop(open)  # Node with the lowest f value
 
-            # Get the first element of the OPEN queue
-            current = open.popleft()  # current is a Node object
+            # Skip stale heap entries (lazy deletion): the state was expanded or reached more cheaply since
+            if key in closed or current.g > best_g[key]:
+                if clock:
+                    stats.time_bookkeeping += clock() - started
+                continue
 
-            # Put the current node in the CLOSED list
-            closed.append(current)  # current is a Node object
+            step += 1  # Increment the number of nodes expanded
+            if observer is not None and observer.tick(stats, step, len(open), f):
+                break  # Cancelled or out of budget
 
             # Check if the current node is the goal
-            if current.state.is_goal():  # Use current state's grid for checking
-                return current, step  # Return the current node and the number of nodes expanded
-            
+            if current.state.is_goal():
+                Search._closeAstarStats(stats, step, best_g)
+                return Search._remember(cache, init_node, variant, pushes, current), step  # Return the current node and the number of nodes expanded
+
+            # Put the current node in the CLOSED set
+            closed.add(key)
+
             # Generate the successors of the current node
-            succ = current.succ()  # Assuming succ() returns a list of Node objects
-            while len(succ) != 0:  # Loop until the successors list is empty
-                child = succ.popleft()  # child is a Node object
+            if clock:
+                generating = clock()
+                stats.time_bookkeeping += generating - started
+            children = current.succ(pushes, macros)
+            if clock:
+                stats.time_successors += clock() - generating
+            stats.generated += len(children)
+
+            for child in children:
+                if clock:
+                    started = clock()
+                child_key = key_of(child.state)
+                # Keep the child only if it improves on the best known path to its state
+                if child.g >= best_g.get(child_key, inf):
+                    stats.duplicates += 1
+                    if clock:
+                        stats.time_bookkeeping += clock() - started
+                    continue
+                if clock:
+                    evaluating = clock()
+                    stats.time_bookkeeping += evaluating - started
                 child.costHeur(heuristique)
+                if clock:
+                    started = clock()
+                    stats.time_heuristic += started - evaluating
+                if child.h != inf:  # An infinite h proves the child can never reach the goal
+                    best_g[child_key] = child.g
+                    closed.discard(child_key)  # Reopen the state if it was already expanded
+                    heappush(open, (child.g + weight * child.h, next(tie), child, child_key))
+                if clock:
+                    stats.time_bookkeeping += clock() - started
+            stats.peak_frontier = max(stats.peak_frontier, len(open))
+
+        # The OPEN queue is empty (or the observer stopped the search) => goal not found
+        Search._closeAstarStats(stats, step, best_g)
+        return None, -1
+
+    @staticmethod
+    def _closeAstarStats(stats, step, best_g):
+        """Record the final counters of an A* search."""
+        stats.expanded = step
+        stats.visited = len(best_g)
+
+    @staticmethod  # Anytime repairing A* (ARA*)
+    def anytimeAstar(init_node, heuristique=4, weight=5, decrement=1, pushes=False, time_budget=None,
+                     stats=None, observer=None, on_solution=None):
+        """Weighted A* that returns a first solution fast, then keeps improving it while time remains.
+
+        Each iteration orders OPEN by g + weight * h and stops once no state in
+        OPEN can beat the best solution; the weight is then lowered by decrement
+        (down to 1) and the next iteration reuses the search so far: states
+        improved after they were expanded are queued again rather than searched
+        from scratch. Every better solution is passed to on_solution and
+        appended to stats.solutions as a dict with its cost, the weight, and its
+        proven suboptimality bound (cost <= bound * optimum, inf unless the
+        heuristic is admissible); bound 1 means it is optimal.
+        Returns the best node found when weight 1 completes or time_budget
+        seconds ran out, and the number of nodes expanded.
+        """
+        stats = stats if stats is not None else SearchStats()
+        key_of = Search.stateKey(pushes)
+        started = perf_counter()
+        deadline = inf if time_budget is None else started + time_budget
+        admissible = heuristique in Node.admissible
+        g0 = init_node.g  # The root's g, subtracted from every cost
+        if observer is not None:
+            observer.start(init_node.state.level)
+        if init_node.state.is_goal():
+            return init_node, 0
+
+        tie = count()
+        init_node.costHeur(heuristique)
+        init_key = key_of(init_node.state)
+        best_g = {init_key: init_node.g}  # Best known g per state key
+        in_open = {init_key: init_node}  # Node of every state in OPEN, heap entries of other nodes are stale
+        open = [(init_node.g + weight * init_node.h, next(tie), init_node, init_key)]
+        incons = {}  # States improved after their expansion in this iteration, queued again in the next one
+        best = None  # Best goal node found so far
+        reported = None
+        step = 0
+        stopped = False
+
+        while True:
+            closed = set()  # States expanded in this iteration
+            while open and not stopped:
+                f, _, current, key = open[0]
+                if in_open.get(key) is not current:  # Stale entry
+                    heappop(open)
+                    continue
+                if best is not None and f >= best.g:  # Nothing left in OPEN can improve the solution at this weight
+                    break
+                heappop(open)
+                del in_open[key]
+                step += 1
+                if observer is not None and observer.tick(stats, step, len(in_open), f):
+                    stopped = True
+                if step % 256 == 0 and perf_counter() >= deadline:
+                    stopped = True
+                closed.add(key)
+
+                children = current.succ(pushes)
+                stats.generated += len(children)
+                for child in children:
+                    child_key = key_of(child.state)
+                    if child.g >= best_g.get(child_key, inf):
+                        stats.duplicates += 1
+                        continue
+                    child.costHeur(heuristique)
+                    if child.h == inf:  # An infinite h proves the child can never reach the goal
+                        continue
+                    best_g[child_key] = child.g
+                    if child.state.is_goal():  # Goals are never expanded, only kept if they are better
+                        if best is None or child.g < best.g:
+                            best = child
+                    elif child_key in closed:
+                        incons[child_key] = child
+                    else:
+                        in_open[child_key] = child
+                        heappush(open, (child.g + weight * child.h, next(tie), child, child_key))
 
-                # Check if the child is not in the OPEN queue
-                if child.state.tab_dyn in [node.state.tab_dyn for node in open]:
-                    index = [node.state.tab_dyn for node in open].index(child.state.tab_dyn)
-                    if child.f(heuristique) < open[index].f(heuristique):
-                        open[index] = child
-                # Check if the child is not in CLOSED list
-                elif child.state.tab_dyn not in [node.state.tab_dyn for node in closed]:
-                    # Put the child in the OPEN queue 
-                    open.append(child)
-                # Check if the child is in CLOSED list    
+            # Report the solution with the bound the remaining states prove
+            if best is not None:
+                lower = min((node.g + node.h for node in (*in_open.values(), *incons.values())), default=best.g)
+                ratio = (best.g - g0) / (min(lower, best.g) - g0) if min(lower, best.g) > g0 else 1
+                bound = (ratio if stopped else min(weight, ratio)) if admissible else inf
+                if reported is None or best.g < reported[0] or bound < reported[1]:
+                    reported = (best.g, bound)
+                    solution = {'cost': best.g - g0, 'weight': weight, 'bound': bound, 'expanded': step,
+                                'time': perf_counter() - started}
+                    stats.solutions.append(solution)
+                    if on_solution is not None:
+                        on_solution(best, solution)
+                if reported[1] == 1:
+                    break
+
+            if stopped or weight == 1 or (not open and not incons and best is None):
+                break
+            # Lower the weight and queue the improved states again, every key recomputed for the new weight
+            weight = max(1, weight - decrement)
+            in_open.update(incons)
+            incons = {}
+            open = [(node.g + weight * node.h, next(tie), node, key) for key, node in in_open.items()]
+            heapify(open)
+
+        Search._closeAstarStats(stats, step, best_g)
+        return (best, step) if best is not None else (None, -1)
+
+    @staticmethod  # Bidirectional search
+    def bidirectional(init_node, stats=None, observer=None, cache=None):
+        """Push-optimal search meeting forward pushes from the start with backward pulls from the goal.
+
+        The backward side starts from the boxes on every target with the robot
+        in each region it could end in. Both sides grow breadth-first one layer
+        at a time, the smaller frontier first, and share one table of
+        region-normalized state keys. Once a layer reaches states of the other
+        side, the shortest of the joined paths is replayed into moves (the node
+        returned is move-level). Needs as many boxes as targets, otherwise a
+        forward push search is run instead.
+        """
+        stats = stats if stats is not None else SearchStats()
+        puzzle = init_node.state
+        level = puzzle.level
+        if puzzle.boxes.bit_count() != len(level.target_cells):  # No single solved configuration to search back from
+            node, step = Search.breadthFirst(init_node, stats, pushes=True, observer=observer, cache=cache)
+            return (None if node is None else Search._replay(init_node, node.expand_pushes())), step
+        cached = Search._cached(cache, init_node, "bidirectional", True)
+        if cached is not None:
+            return cached, 0
+        if puzzle.is_goal():
+            return init_node, 0
+        if observer is not None:
+            observer.start(level)
+
+        # table[key] = (side, depth, parent key, action code) of every state seen by either side (0 forward, 1 backward)
+        start_key = puzzle.normalized_key()
+        table = {start_key: (0, 0, None, -1)}
+        frontiers = [[(puzzle, start_key)], []]
+        covered = bytearray(level.size)
+        for cell in range(level.size):
+            if level.walls[cell] or covered[cell] or level.target_mask >> cell & 1:
+                continue
+            goal = SokobanPuzzle.from_state(level, cell, level.target_mask)
+            reach, _ = goal.reachable()
+            covered = bytearray(a | b for a, b in zip(covered, reach))
+            key = goal.normalized_key()
+            table[key] = (1, 0, None, -1)
+            frontiers[1].append((goal, key))
+
+        step = 0
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1  # Grow the cheaper side
+            layer, frontiers[side] = frontiers[side], []
+            best = None  # (pushes, key reached first, action code, key reached second) of the shortest meeting
+            for state, key in layer:
+                step += 1
+                depth = table[key][1]
+                if side == 0:
+                    children = [(action, child) for action, child, _ in state.push_succ()]
+                else:
+                    children = state.pull_succ()
+                stats.generated += len(children)
+                for action, child in children:
+                    child_key = child.normalized_key()
+                    code = ACTION_INDEX[action] | (state.boxes & ~child.boxes).bit_length() << 2
+                    seen = table.get(child_key)
+                    if seen is None:
+                        table[child_key] = (side, depth + 1, key, code)
+                        frontiers[side].append((child, child_key))
+                        continue
+                    stats.duplicates += 1
+                    if seen[0] != side and (best is None or depth + 1 + seen[1] < best[0]):
+                        best = (depth + 1 + seen[1], key, code, child_key)
+                if observer is not None and observer.tick(stats, step, len(frontiers[0]) + len(frontiers[1]), depth):
+                    Search._closeStats(stats, step, table)
+                    return None, -1  # Cancelled or out of budget
+
+            if best is not None:  # Both sides met: join the halves at the end of the layer
+                _, key, code, child_key = best
+                if side == 0:
+                    pushes, pulls = Search._chain(table, key)[::-1] + [code], Search._chain(table, child_key)
                 else:
-                    index = [node.state.tab_dyn for node in closed].index(child.state.tab_dyn)
-                    if child.f(heuristique) < closed[index].f(heuristique):
-                        closed.remove(closed[index])
-                        open.append(child)
+                    pushes, pulls = Search._chain(table, child_key)[::-1], [code] + Search._chain(table, key)
+                Search._closeStats(stats, step, table)
+                node = Search._replay(init_node, Search._joinMoves(puzzle, pushes, pulls))
+                return Search._remember(cache, init_node, "bidirectional", True, node), step
+
+        # A side ran out of states without meeting the other => goal not found
+        Search._closeStats(stats, step, table)
+        return None, -1
+
+    @staticmethod
+    def _chain(table, key):
+        """Return the action codes leading to key from its side's root, last one first."""
+        codes = []
+        while table[key][2] is not None:
+            _, _, parent, code = table[key]
+            codes.append(code)
+            key = parent
+        return codes
+
+    @staticmethod
+    def _joinMoves(puzzle, pushes, pulls):
+        """Turn forward push codes and backward pull codes (meeting state first) into the moves solving puzzle.
+
+        A pull of the box on b in direction d, the robot ending on q, is undone by
+        walking to q and pushing the box back in the opposite direction.
+        """
+        state = puzzle.copy()
+        step = state.level.step
+        moves = []
+        for code in pushes:
+            d, box = code & 3, (code >> 2) - 1
+            moves.append(state.walk_path(step[OPPOSITE[d]][box]) + ACTIONS[d])
+            for action in moves[-1]:
+                state.apply(action)
+        for code in pulls:
+            d, box = code & 3, (code >> 2) - 1
+            moves.append(state.walk_path(step[d][step[d][box]]) + ACTIONS[OPPOSITE[d]])
+            for action in moves[-1]:
+                state.apply(action)
+        return "".join(moves)
+
+    @staticmethod  # IDA* algorithm
+    def idaStar(init_node, heuristique=1, table_size=0, stats=None, observer=None, cache=None):
+        """Iterative deepening A*: depth-first searches bounded by f, with memory linear in the solution depth.
+
+        Moves are applied to a single puzzle in place and undone on backtrack.
+        With table_size > 0 a fixed-size transposition table (indexed by the
+        Zobrist key) skips states already reached as cheaply in the same iteration.
+        An observer gets progress reports (open is the current depth, bound the f bound) and may stop the search.
+        A SolutionCache is consulted first (a hit returns 0 nodes expanded) and filled with the solution found.
+        """
+        stats = stats if stats is not None else SearchStats()
+        variant = f"idastar/h{heuristique}"
+        cached = Search._cached(cache, init_node, variant, False)
+        if cached is not None:
+            return cached, 0
+        if observer is not None:
+            observer.start(init_node.state.level)
+
+        # Check if the start element is the goal
+        if init_node.state.is_goal():
+            return init_node, 0
+
+        puzzle = init_node.state.copy()  # The only puzzle of the search, mutated in place
+        level = puzzle.level
+        table = [None] * table_size  # Entries are (key, g, iteration)
+        bound = Node.estimate(puzzle, heuristique)
+        iteration = 0
+        step = 0
+
+        while bound != inf:
+            iteration += 1
+            next_bound = inf  # Smallest f that exceeded the bound, the next iteration's bound
+            path = []  # Action of every move from the start
+            undo = []  # Undo token of every move, to backtrack
+            on_path = {puzzle.hash}  # States on the current path, never revisited
+            stack = [iter(ACTIONS)]  # Remaining actions to try at every depth
+            step += 1
+
+            while stack:
+                action = next(stack[-1], None)
+                if action is None:  # Every action tried: backtrack
+                    stack.pop()
+                    if undo:
+                        on_path.discard(puzzle.hash)
+                        puzzle.undo(undo.pop())
+                        path.pop()
+                    continue
+
+                if puzzle.peek_key(action) in on_path:  # Illegal moves peek None, which is never on the path
+                    continue
+                token = puzzle.apply(action)  # Apply the move in place
+                if token is None:
+                    continue
+                # Prune pushes that deadlock the box that was just pushed
+                if token & 4 and level.deadlocks.is_deadlock(puzzle.boxes, level.step[token & 3][puzzle.player]):
+                    puzzle.undo(token)
+                    continue
+                stats.generated += 1
+
+                undo.append(token)
+                g = len(undo)
+                f = g + Node.estimate(puzzle, heuristique)
+
+                if f > bound or Search._seenInTable(table, puzzle.hash, g, iteration):
+                    next_bound = min(next_bound, f) if f > bound else next_bound
+                    puzzle.undo(undo.pop())  # Undo the move
+                    continue
+
+                path.append(action)
+                on_path.add(puzzle.hash)
+                if puzzle.is_goal():
+                    stats.expanded = step
+                    return Search._remember(cache, init_node, variant, False, Search._replay(init_node, path)), step
+
+                stack.append(iter(ACTIONS))  # Expand the new state
+                step += 1
+                if observer is not None and observer.tick(stats, step, len(stack), bound):
+                    stats.expanded = step  # Cancelled or out of budget
+                    return None, -1
+
+            bound = next_bound
+
+        # Every bound was exhausted => goal not found
+        stats.expanded = step
+        return None, -1
+
+    @staticmethod
+    def _seenInTable(table, key, g, iteration):
+        """Check the transposition table for key reached with at most g moves in this iteration, else record it."""
+        if not table:
+            return False
+        slot = key % len(table)
+        entry = table[slot]
+        if entry is not None and entry[0] == key and entry[2] == iteration and entry[1] <= g:
+            return True
+        table[slot] = (key, g, iteration)  # Always replace: the newest entry is the most likely to be hit
+        return False
+
+    @staticmethod
+    def _cached(cache, init_node, variant, pushes):
+        """Return the node chain of a cached solution of init_node, or None.
+
+        Move-optimal solutions depend on the robot's exact cell; push-level
+        ones only on its region.
+        """
+        if cache is None:
+            return None
+        moves = cache.get(init_node.state, variant, exact_player=not pushes)
+        return None if moves is None else Search._replay(init_node, moves)
+
+    @staticmethod
+    def _remember(cache, init_node, variant, pushes, node):
+        """Store the solution ending at node in the cache, and return node."""
+        if cache is not None:
+            moves = node.expand_pushes() if pushes else node.moves
+            cache.put(init_node.state, variant, moves, exact_player=not pushes)
+        return node
+
+    @staticmethod
+    def _replay(init_node, path):
+        """Rebuild the chain of nodes for a list of actions played from init_node."""
+        node = init_node
+        for action in path:
+            node = Node(node.state.perform_action(action), node, action)
+        return node
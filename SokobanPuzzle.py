@@ -1,6 +1,10 @@
-# SokobanPuzzle.py
 import numpy as np
-from copy import deepcopy
+import random
+from collections import deque
+from hashlib import blake2b
+from Deadlock import simple_dead_cells, DeadlockDetector
+from Macros import MacroPusher
+from Matching import INF_COST
 
 # Define constants for grid elements
 PLAYER = 'R'
@@ -11,132 +15,430 @@ BOX = 'B'
 PLAYER_ON_TARGET = '.'
 BOX_ON_TARGET = '*'
 
+# Actions in the order used by every successor generator, and their (row, col) offsets
+ACTIONS = ('U', 'D', 'L', 'R')
+DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+ACTION_INDEX = {action: d for d, action in enumerate(ACTIONS)}
+OPPOSITE = (1, 0, 3, 2)  # Direction index of the reverse of each action
+
+ZOBRIST_SEED = 0x50C0BA4  # Fixed so state hashes are reproducible across runs and processes
+
+
+def cells_of(mask):
+    """Yield the cell indices of the bits set in a bitboard."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Level:
+    """Static part of a puzzle (walls and targets), shared by every state of a search."""
+    def __init__(self, grid):
+        grid = np.array(grid)
+        self.rows, self.cols = grid.shape
+        self.size = self.rows * self.cols
+
+        # Walls as a byte per cell, targets as a bitboard (cell index = row * cols + col)
+        self.walls = bytearray(self.size)
+        self.target_mask = 0
+        for r in range(self.rows):
+            for c in range(self.cols):
+                cell = r * self.cols + c
+                if grid[r][c] == WALL:
+                    self.walls[cell] = 1
+                elif grid[r][c] in (TARGET, BOX_ON_TARGET, PLAYER_ON_TARGET):
+                    self.target_mask |= 1 << cell
+        self.target_cells = tuple(cells_of(self.target_mask))
+
+        # step[d][cell] is the neighbour of cell in direction d, or -1 if it is a wall or off the board
+        self.step = tuple(
+            tuple(self._neighbour(cell, dr, dc) for cell in range(self.size))
+            for dr, dc in DELTAS
+        )
+
+        # dead[cell] is 1 when a box pushed onto cell can never reach a target
+        self.dead = simple_dead_cells(self)
+        self.deadlocks = DeadlockDetector(self)  # Dynamic checks run on every push in succ
+        self.macros = MacroPusher(self)  # Tunnels and goal rooms, used by push_succ(macros=True)
+
+        # target_dist[cell][t] is the number of pushes needed to bring a box from cell to target t
+        distances = [self._pull_distances(target) for target in self.target_cells]
+        self.target_dist = tuple(zip(*distances)) if distances else ((),) * self.size
+
+        # 64-bit Zobrist keys for a box and for the player on each cell
+        rng = random.Random(ZOBRIST_SEED)
+        self.zobrist_box = tuple(rng.getrandbits(64) for _ in range(self.size))
+        self.zobrist_player = tuple(rng.getrandbits(64) for _ in range(self.size))
+
+        # Walls and targets only, rendered once (used as Node.tab_stat and as the base of SokobanPuzzle.grid)
+        self.static_grid = np.full((self.rows, self.cols), EMPTY)
+        for cell in range(self.size):
+            if self.walls[cell]:
+                self.static_grid[cell // self.cols][cell % self.cols] = WALL
+        for cell in self.target_cells:
+            self.static_grid[cell // self.cols][cell % self.cols] = TARGET
+
+        # Code of every cell without boxes or player (0 wall, 1 floor, 3 target), the base of canonical()
+        self.cell_codes = bytes(0 if self.walls[cell] else 3 if self.target_mask >> cell & 1 else 1
+                                for cell in range(self.size))
+
+    def _neighbour(self, cell, dr, dc):
+        """Return the index of the cell next to cell in direction (dr, dc), or -1 if it is blocked."""
+        r, c = divmod(cell, self.cols)
+        r, c = r + dr, c + dc
+        if not (0 <= r < self.rows and 0 <= c < self.cols):
+            return -1
+        neighbour = r * self.cols + c
+        return -1 if self.walls[neighbour] else neighbour
+
+    def _pull_distances(self, target):
+        """Breadth-first search of box pulls from target, giving the push distance of every cell to it."""
+        distance = [INF_COST] * self.size
+        distance[target] = 0
+        queue = deque([target])
+        while queue:
+            box = queue.popleft()
+            for step in self.step:
+                # Pulling the box one cell needs the player two cells away in that direction
+                behind = step[box]
+                if behind < 0 or distance[behind] != INF_COST or step[behind] < 0:
+                    continue
+                distance[behind] = distance[box] + 1
+                queue.append(behind)
+        return distance
+
+    def zobrist(self, player, boxes):
+        """Compute the Zobrist hash of a state from scratch."""
+        h = self.zobrist_player[player]
+        for cell in cells_of(boxes):
+            h ^= self.zobrist_box[cell]
+        return h
+
+    def index(self, position):
+        """Convert a (row, col) position to a cell index."""
+        return position[0] * self.cols + position[1]
+
+    def position(self, cell):
+        """Convert a cell index to a (row, col) position."""
+        return divmod(cell, self.cols)
+
+
+class Symmetry:
+    """One of the 8 rotations and mirror images of a rows x cols board.
+
+    The board is transposed first if transpose is set, then its rows and/or
+    columns are reversed. Cells and moves can be mapped both ways, so a
+    solution found on the transformed board can be played on the original.
+    """
+    __slots__ = ('transpose', 'flip_rows', 'flip_cols', 'rows', 'cols', 'forward', 'backward')
+
+    def __init__(self, transpose, flip_rows, flip_cols, rows, cols):
+        self.transpose, self.flip_rows, self.flip_cols = transpose, flip_rows, flip_cols
+        self.rows, self.cols = rows, cols  # Size of the original board
+        letters = []
+        for dr, dc in DELTAS:
+            if transpose:
+                dr, dc = dc, dr
+            letters.append(ACTIONS[DELTAS.index((-dr if flip_rows else dr, -dc if flip_cols else dc))])
+        letters = "".join(letters)
+        self.forward = str.maketrans(''.join(ACTIONS), letters)  # Original move -> transformed move
+        self.backward = str.maketrans(letters, ''.join(ACTIONS))
+
+    @classmethod
+    def all(cls, rows, cols):
+        """The 8 symmetries of a rows x cols board, the identity first."""
+        return [cls(t, v, h, rows, cols) for t in (False, True) for v in (False, True) for h in (False, True)]
+
+    @property
+    def shape(self):
+        """Size of the transformed board."""
+        return (self.cols, self.rows) if self.transpose else (self.rows, self.cols)
+
+    def board(self, array):
+        """Transform a rows x cols numpy array (a view, no copy)."""
+        if self.transpose:
+            array = array.T
+        if self.flip_rows:
+            array = array[::-1]
+        if self.flip_cols:
+            array = array[:, ::-1]
+        return array
+
+    def cell(self, cell):
+        """Map a cell index of the original board to the transformed board."""
+        r, c = divmod(cell, self.cols)
+        if self.transpose:
+            r, c = c, r
+        rows, cols = self.shape
+        if self.flip_rows:
+            r = rows - 1 - r
+        if self.flip_cols:
+            c = cols - 1 - c
+        return r * cols + c
+
+    def origin_cell(self, cell):
+        """Map a cell index of the transformed board back to the original board."""
+        rows, cols = self.shape
+        r, c = divmod(cell, cols)
+        if self.flip_rows:
+            r = rows - 1 - r
+        if self.flip_cols:
+            c = cols - 1 - c
+        if self.transpose:
+            r, c = c, r
+        return r * self.cols + c
+
+    def moves(self, moves):
+        """Map a move string played on the original board to the transformed board."""
+        return moves.translate(self.forward)
+
+    def origin_moves(self, moves):
+        """Map a move string played on the transformed board back to the original board."""
+        return moves.translate(self.backward)
+
+
 class SokobanPuzzle:
-    def __init__(self, grid, robot_position):
-        self.grid = np.array(grid)  # Dynamic elements of the puzzle (robot, boxes)
-        self.robot_position = robot_position  # Robot's position tuple
-        self.moves = {
-            "U": (-1, 0),  # Move Up
-            "D": (1, 0),   # Move Down
-            "L": (0, -1),  # Move Left
-            "R": (0, 1)    # Move Right
-        }
+    __slots__ = ('level', 'player', 'boxes', 'hash')  # The static part lives in the shared level
+
+    # Move Up, Down, Left, Right
+    moves = dict(zip(ACTIONS, DELTAS))
+
+    def __init__(self, grid, robot_position=None, level=None):
+        grid = np.array(grid)
+        self.level = level if level is not None else Level(grid)  # Static elements, never copied
+
+        # Dynamic elements of the puzzle: the robot's cell and a bitboard of box cells
+        if robot_position is None:
+            robot_position = tuple(int(i) for i in np.argwhere((grid == PLAYER) | (grid == PLAYER_ON_TARGET))[0])
+        self.player = self.level.index(robot_position)
+        self.boxes = 0
+        for r, c in np.argwhere((grid == BOX) | (grid == BOX_ON_TARGET)):
+            self.boxes |= 1 << (int(r) * self.level.cols + int(c))
+        self.hash = self.level.zobrist(self.player, self.boxes)  # Kept up to date by execute_move
+
+    @classmethod
+    def from_state(cls, level, player, boxes, hash=None):
+        """Build a puzzle sharing level, without parsing a grid."""
+        puzzle = cls.__new__(cls)
+        puzzle.level = level
+        puzzle.player = player
+        puzzle.boxes = boxes
+        puzzle.hash = level.zobrist(player, boxes) if hash is None else hash
+        return puzzle
+
+    def copy(self):
+        """Return a new puzzle with the same dynamic state and the same (shared) level."""
+        return SokobanPuzzle.from_state(self.level, self.player, self.boxes, self.hash)
+
+    def key(self):
+        """64-bit Zobrist key identifying the dynamic state (player cell and box cells)."""
+        return self.hash
+
+    def normalized_key(self):
+        """64-bit Zobrist key of the box cells and the robot's region rather than its exact cell."""
+        _, region = self.reachable()
+        zobrist_player = self.level.zobrist_player
+        return self.hash ^ zobrist_player[self.player] ^ zobrist_player[region]
+
+    def canonical(self, exact_player=False):
+        """Return (key, symmetry) of the smallest of the 8 rotations and mirror images of this state.
+
+        The board is coded cell by cell (walls, targets, boxes and the robot's
+        region, or its exact cell) and the transform giving the
+        lexicographically smallest code is chosen, so rotated and mirrored
+        copies of a level share one key. key is a digest stable across runs;
+        the symmetry maps cells and moves between this board and the canonical one.
+        """
+        level = self.level
+        codes = np.frombuffer(level.cell_codes, dtype=np.uint8).copy()
+        for cell in cells_of(self.boxes):
+            codes[cell] |= 4
+        if exact_player:
+            codes[self.player] |= 8
+        else:
+            codes |= np.frombuffer(self.reachable()[0], dtype=np.uint8) << 3
+        codes = codes.reshape(level.rows, level.cols)
+
+        best = None
+        for symmetry in Symmetry.all(level.rows, level.cols):
+            candidate = (symmetry.shape, symmetry.board(codes).tobytes())
+            if best is None or candidate < best[0]:
+                best = (candidate, symmetry)
+        (rows, cols), board = best[0]
+        return blake2b(b'%d,%d;' % (rows, cols) + board, digest_size=16).digest(), best[1]
+
+    def canonical_key(self, exact_player=False):
+        """Digest identifying the level and state up to rotation and mirroring, stable across runs.
+
+        Unlike key() it identifies the level as well as the state, so it can
+        key solutions stored on disk and deduplicate level collections.
+        """
+        return self.canonical(exact_player)[0]
+
+    def reachable(self):
+        """Flood fill the cells the robot can walk to without pushing a box.
+
+        Returns a bytearray marking the reached cells and the smallest reached
+        cell index, which names the robot's region canonically.
+        """
+        step = self.level.step
+        boxes = self.boxes
+        reach = bytearray(self.level.size)
+        reach[self.player] = 1
+        region = self.player
+        stack = [self.player]
+        while stack:
+            cell = stack.pop()
+            for d in range(4):
+                neighbour = step[d][cell]
+                if neighbour >= 0 and not reach[neighbour] and not boxes >> neighbour & 1:
+                    reach[neighbour] = 1
+                    stack.append(neighbour)
+                    if neighbour < region:
+                        region = neighbour
+        return reach, region
+
+    def walk_path(self, target):
+        """Return the shortest move string walking the robot to target without pushing a box, or None."""
+        step = self.level.step
+        boxes = self.boxes
+        came_from = {self.player: None}  # cell -> (previous cell, action index)
+        queue = deque([self.player])
+        while queue and target not in came_from:
+            cell = queue.popleft()
+            for d in range(4):
+                neighbour = step[d][cell]
+                if neighbour >= 0 and neighbour not in came_from and not boxes >> neighbour & 1:
+                    came_from[neighbour] = (cell, d)
+                    queue.append(neighbour)
+        if target not in came_from:
+            return None
+
+        path = []
+        cell = target
+        while came_from[cell] is not None:
+            cell, d = came_from[cell]
+            path.append(ACTIONS[d])
+        return "".join(reversed(path))
+
+    @property
+    def robot_position(self):
+        """Robot's position tuple."""
+        return self.level.position(self.player)
+
+    @property
+    def grid(self):
+        """Render the puzzle as an array of single-character strings."""
+        grid = self.level.static_grid.copy()
+        cols = self.level.cols
+        for cell in cells_of(self.boxes):
+            grid[cell // cols][cell % cols] = BOX_ON_TARGET if grid[cell // cols][cell % cols] == TARGET else BOX
+        r, c = self.robot_position
+        grid[r][c] = PLAYER_ON_TARGET if grid[r][c] == TARGET else PLAYER
+        return grid
 
     def is_goal(self):
-        # Check if all targets ('S') have boxes ('B' or '*')
-        S_indices_x, S_indices_y = np.where(self.grid == TARGET)  # Get all target spaces
-        for ind_x, ind_y in zip(S_indices_x, S_indices_y):
-            if self.grid[ind_x][ind_y] != BOX and self.grid[ind_x][ind_y] != BOX_ON_TARGET:
-                return False
-        return True
+        # Check if all targets have boxes
+        return self.boxes & self.level.target_mask == self.level.target_mask
+
+    def try_move(self, d):
+        """Return the (player, boxes, hash) reached by moving in direction index d, or None if the move is illegal."""
+        level = self.level
+        step = level.step[d]
+        new_player = step[self.player]
+        if new_player < 0:  # Wall or edge of the board
+            return None
+
+        # XOR the player out of its old cell and into the new one
+        zobrist_player = level.zobrist_player
+        hash = self.hash ^ zobrist_player[self.player] ^ zobrist_player[new_player]
+        bit = 1 << new_player
+        if self.boxes & bit:  # Pushing a box
+            new_box = step[new_player]
+            # Ensure the next position is not a wall or another box
+            if new_box < 0 or self.boxes & (1 << new_box):
+                return None
+            return new_player, self.boxes ^ bit ^ (1 << new_box), hash ^ level.zobrist_box[new_player] ^ level.zobrist_box[new_box]
+        return new_player, self.boxes, hash
 
     def execute_move(self, direction):
-        # Determine new position based on direction
-        new_r, new_c = self.robot_position
-        if direction == 'U':
-            new_r -= 1
-        elif direction == 'D':
-            new_r += 1
-        elif direction == 'L':
-            new_c -= 1
-        elif direction == 'R':
-            new_c += 1
-
-        # Check if the new position is a wall
-        if self.grid[new_r][new_c] == WALL:
-            return False
-
-        # Check if the new position is a box
-        if self.grid[new_r][new_c] in (BOX, BOX_ON_TARGET):
-            next_r, next_c = new_r, new_c
-            if direction == 'U':
-                next_r -= 1
-            elif direction == 'D':
-                next_r += 1
-            elif direction == 'L':
-                next_c -= 1
-            elif direction == 'R':
-                next_c += 1
+        """Move the robot in place in the given direction ('U', 'D', 'L' or 'R')."""
+        return self.apply(direction) is not None
+
+    def apply(self, action):
+        """Execute action in place and return a token that undo() takes to revert it, or None if it is illegal.
+
+        The token is a small int (direction index + 4 if a box was pushed), so
+        applying and undoing moves allocates nothing.
+        """
+        d = ACTION_INDEX[action]
+        level = self.level
+        step = level.step[d]
+        new_player = step[self.player]
+        if new_player < 0:  # Wall or edge of the board
+            return None
 
+        token = d
+        bit = 1 << new_player
+        if self.boxes & bit:  # Pushing a box
+            new_box = step[new_player]
             # Ensure the next position is not a wall or another box
-            if self.grid[next_r][next_c] in (EMPTY, TARGET):
-                # Move the box
-                if self.grid[next_r][next_c] == TARGET:
-                    self.grid[next_r][next_c] = BOX_ON_TARGET
-                else:
-                    self.grid[next_r][next_c] = BOX
-
-                # Restore target if the box was on one
-                if self.grid[new_r][new_c] == BOX_ON_TARGET:
-                    self.grid[new_r][new_c] = TARGET
-                else:
-                    self.grid[new_r][new_c] = EMPTY
-            else:
-                return False
-
-        # Move the robot
-        if self.grid[new_r][new_c] == TARGET:
-            self.grid[new_r][new_c] = PLAYER_ON_TARGET
-        else:
-            self.grid[new_r][new_c] = PLAYER
+            if new_box < 0 or self.boxes & (1 << new_box):
+                return None
+            self.boxes ^= bit | (1 << new_box)
+            self.hash ^= level.zobrist_box[new_player] ^ level.zobrist_box[new_box]
+            token += 4
 
-        # Restore target if the robot was on one
-        if self.grid[self.robot_position[0]][self.robot_position[1]] == PLAYER_ON_TARGET:
-            self.grid[self.robot_position[0]][self.robot_position[1]] = TARGET
-        else:
-            self.grid[self.robot_position[0]][self.robot_position[1]] = EMPTY
+        # XOR the player out of its old cell and into the new one
+        self.hash ^= level.zobrist_player[self.player] ^ level.zobrist_player[new_player]
+        self.player = new_player
+        return token
+
+    def undo(self, token):
+        """Revert exactly the move that apply() returned token for."""
+        d = token & 3
+        level = self.level
+        old_player = level.step[OPPOSITE[d]][self.player]  # The robot came from the opposite side
+        if token & 4:  # Pull the pushed box back onto the robot's cell
+            box = level.step[d][self.player]
+            self.boxes ^= (1 << box) | (1 << self.player)
+            self.hash ^= level.zobrist_box[box] ^ level.zobrist_box[self.player]
+        self.hash ^= level.zobrist_player[self.player] ^ level.zobrist_player[old_player]
+        self.player = old_player
 
-        # Update robot position
-        self.robot_position = (new_r, new_c)
-        return True
+    def peek_key(self, action):
+        """Return the key() of the state action would lead to, or None if it is illegal, without moving."""
+        result = self.try_move(ACTION_INDEX[action])
+        return None if result is None else result[2]
+
+    def check_solution(self, moves):
+        """Return True if playing moves from this state solves the puzzle; the state is left unchanged."""
+        tokens = []
+        for action in moves:
+            token = self.apply(action)
+            if token is None:
+                break
+            tokens.append(token)
+        solved = len(tokens) == len(moves) and self.is_goal()
+        for token in reversed(tokens):
+            self.undo(token)
+        return solved
 
     def move(self, direction):
-        """General method to move the robot in the given direction."""
-        dx, dy = direction
-        robot_x, robot_y = self.robot_position
-        new_robot_x, new_robot_y = robot_x + dx, robot_y + dy
-
-        # Check boundaries and wall
-        if not self.is_in_bounds(new_robot_x, new_robot_y) or self.grid[new_robot_x][new_robot_y] == WALL:
-            return False
-        # Check if the robot is moving towards a box
-        if self.grid[new_robot_x][new_robot_y] == BOX:
-            # Check if the box can be pushed
-            new_box_x, new_box_y = new_robot_x + dx, new_robot_y + dy
-            if not self.is_in_bounds(new_box_x, new_box_y) or self.grid[new_box_x][new_box_y] == BOX or self.grid[new_box_x][new_box_y] == WALL:
-                return False  # Can't push the box
-            # Move the box
-            self.update_position((new_box_x, new_box_y), (new_robot_x, new_robot_y), BOX)
-        # Move the robot
-        self.update_position((new_robot_x, new_robot_y), (robot_x, robot_y), PLAYER)
-        self.robot_position = (new_robot_x, new_robot_y)
-        return True
+        """General method to move the robot in the given (dx, dy) direction."""
+        return self.execute_move(ACTIONS[DELTAS.index(tuple(direction))])
 
     def perform_action(self, action):
         """Perform an action and return the new state."""
-        next_state = deepcopy(self)  # Create a deep copy of the current state
-        if next_state.execute_move(action):  # Attempt to execute the action
-            return next_state  # Return the new state if the action was successful
-        return None  # Return None if the action was not successful
+        result = self.try_move(ACTION_INDEX[action])
+        if result is None:
+            return None  # Return None if the action was not successful
+        return SokobanPuzzle.from_state(self.level, *result)
 
     def is_in_bounds(self, x, y):
         """Check if the position is within the bounds of the grid."""
-        return 0 <= x < self.grid.shape[0] and 0 <= y < self.grid.shape[1]
-
-    def update_position(self, new_pos, old_pos, element):
-        """Update the position of the robot or box."""
-        new_x, new_y = new_pos
-        old_x, old_y = old_pos
-        # Update the new position (check if it's a target space or not)
-        if self.grid[new_x][new_y] == TARGET:
-            self.grid[new_x][new_y] = BOX_ON_TARGET if element == BOX else PLAYER_ON_TARGET
-        else:
-            self.grid[new_x][new_y] = element
-        # Update the old position
-        if self.grid[old_x][old_y] == BOX_ON_TARGET:
-            self.grid[old_x][old_y] = TARGET
-        else:
-            self.grid[old_x][old_y] = EMPTY
+        return 0 <= x < self.level.rows and 0 <= y < self.level.cols
 
     def print_board(self):
         """Print the current dynamic state of the board."""
@@ -147,12 +449,112 @@ class SokobanPuzzle:
     def succ(self):
         """Generates pairs of (action, successor) representing all valid moves."""
         successors = []
-        for action, direction in self.moves.items():
-            next_state = deepcopy(self)  # Create a deep copy of the current puzzle state
-            if next_state.execute_move(action):  # Check if the move is valid
-                successors.append((action, next_state))
+        deadlocks = self.level.deadlocks
+        for d, action in enumerate(ACTIONS):
+            result = self.try_move(d)  # Only legal moves build a new state
+            if result is None:
+                continue
+            # Prune pushes that deadlock the box that was just pushed
+            if result[1] != self.boxes and deadlocks.is_deadlock(result[1], self.level.step[d][result[0]]):
+                continue
+            successors.append((action, SokobanPuzzle.from_state(self.level, *result)))
         return successors
 
+    def push_succ(self, macros=False):
+        """Generates triples of (action, successor, pushes) for every box push the robot can walk to.
+
+        The action is the direction of the push; the successor has the robot on
+        the cell the box left. Walks between pushes are rebuilt afterwards with
+        walk_path. With macros a push into a tunnel or onto a goal room's
+        entrance is continued by level.macros: pushes is then the number of
+        pushes it took and the action the direction of the last one.
+        """
+        level = self.level
+        step = level.step
+        zobrist_box, zobrist_player = level.zobrist_box, level.zobrist_player
+        reach, _ = self.reachable()
+        successors = []
+        for box in cells_of(self.boxes):
+            for d in range(len(ACTIONS)):
+                dest = step[d][box]
+                stand = step[OPPOSITE[d]][box]  # The robot pushes from the opposite side
+                if dest < 0 or stand < 0 or not reach[stand] or self.boxes >> dest & 1:
+                    continue
+                boxes = self.boxes ^ (1 << box) ^ (1 << dest)
+                pushed = level.macros.extend(boxes, box, dest, d) if macros else ((box, boxes, dest, 1, d),)
+                for player, boxes, dest, pushes, last in pushed:
+                    if level.deadlocks.is_deadlock(boxes, dest):
+                        continue
+                    hash = (self.hash ^ zobrist_player[self.player] ^ zobrist_player[player]
+                            ^ zobrist_box[box] ^ zobrist_box[dest])
+                    successors.append((ACTIONS[last], SokobanPuzzle.from_state(level, player, boxes, hash), pushes))
+        return successors
+
+    def pull_succ(self):
+        """Generates pairs of (action, predecessor) for every box pull the robot can walk to, for backward search.
+
+        A pull in direction d moves the robot from the cell next to a box one
+        more cell in direction d, dragging the box onto the cell it left. Played
+        backwards it is the push of that box in the opposite direction.
+        """
+        level = self.level
+        step = level.step
+        zobrist_box, zobrist_player = level.zobrist_box, level.zobrist_player
+        reach, _ = self.reachable()
+        successors = []
+        for box in cells_of(self.boxes):
+            for d, action in enumerate(ACTIONS):
+                stand = step[d][box]  # The robot pulls from the box's side in direction d
+                if stand < 0 or not reach[stand]:
+                    continue
+                dest = step[d][stand]
+                if dest < 0 or self.boxes >> dest & 1:
+                    continue
+                boxes = self.boxes ^ (1 << box) ^ (1 << stand)
+                hash = self.hash ^ zobrist_player[self.player] ^ zobrist_player[dest] ^ zobrist_box[box] ^ zobrist_box[stand]
+                successors.append((action, SokobanPuzzle.from_state(level, dest, boxes, hash)))
+        return successors
+
+    def push_path(self, box, dest, last):
+        """Return the moves (walks included) pushing the box on cell box to dest with a last push in direction last.
+
+        Other boxes stay where they are; the fewest pushes are used. Returns
+        None if it cannot be done. Used to replay macro pushes.
+        """
+        level = self.level
+        step = level.step
+        end = (dest, step[OPPOSITE[last]][dest])  # Box on dest with the robot behind it
+        others = self.boxes & ~(1 << box)
+        start = (box, self.player)
+        came_from = {start: None}  # (box, player) -> (previous (box, player), push direction)
+        queue = deque([start])
+        while queue and end not in came_from:
+            state = queue.popleft()
+            box_cell, player = state
+            reach, _ = SokobanPuzzle.from_state(level, player, others | 1 << box_cell, 0).reachable()
+            for d in range(4):
+                stand, target = step[OPPOSITE[d]][box_cell], step[d][box_cell]
+                if stand < 0 or target < 0 or not reach[stand] or others >> target & 1:
+                    continue
+                if (target, box_cell) not in came_from:
+                    came_from[(target, box_cell)] = (state, d)
+                    queue.append((target, box_cell))
+        if end not in came_from:
+            return None
+
+        pushes = []  # (box cell before the push, push direction), last push first
+        state = end
+        while came_from[state] is not None:
+            state, d = came_from[state]
+            pushes.append((state[0], d))
+        puzzle = self.copy()
+        moves = []
+        for box_cell, d in reversed(pushes):
+            moves.append(puzzle.walk_path(step[OPPOSITE[d]][box_cell]) + ACTIONS[d])
+            for action in moves[-1]:
+                puzzle.apply(action)
+        return "".join(moves)
+
     def get_possible_actions(self):
         """Return a list of possible actions (U, D, L, R)."""
         return list(self.moves.keys())
@@ -0,0 +1,110 @@
+import sqlite3
+import time
+from hashlib import blake2b
+
+# One row per solved (level, state, search variant); totals are kept by triggers so limits are checked in O(1)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    key BLOB PRIMARY KEY,
+    player INTEGER NOT NULL,  -- Start cell of the solution, on the canonical board
+    moves TEXT NOT NULL,  -- Solution on the canonical board
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, bytes INTEGER);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS solutions_insert AFTER INSERT ON solutions BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + length(new.key) + length(new.moves) + 16;
+END;
+CREATE TRIGGER IF NOT EXISTS solutions_delete AFTER DELETE ON solutions BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - length(old.key) - length(old.moves) - 16;
+END;
+CREATE TRIGGER IF NOT EXISTS solutions_update AFTER UPDATE OF moves ON solutions BEGIN
+    UPDATE totals SET bytes = bytes + length(new.moves) - length(old.moves);
+END;
+"""
+
+
+class SolutionCache:
+    """Persistent cache of solutions in an SQLite file, shared by every process using the same path.
+
+    Entries are keyed by SokobanPuzzle.canonical and a search variant
+    (solutions of different searches are not interchangeable, e.g. weighted
+    A* is not optimal). Solutions are stored on the canonical board, so a
+    rotated or mirrored copy of a level hits the same entry. When max_entries
+    or max_bytes is exceeded the least recently used entries are evicted.
+    """
+    def __init__(self, path=':memory:', max_entries=100_000, max_bytes=64 << 20):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # Bytes of keys and solutions, excluding SQLite's own overhead
+        self.hits = 0
+        self.misses = 0
+        # Autocommit: a lookup never holds a lock while the caller searches
+        self.db = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Readers and one writer at once, no fsync per lookup
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def entry_key(puzzle, variant, exact_player):
+        """Return (key of the cache entry of puzzle for a search variant, symmetry to the canonical board)."""
+        key, symmetry = puzzle.canonical(exact_player)
+        return blake2b(key + variant.encode(), digest_size=16).digest(), symmetry
+
+    def get(self, puzzle, variant, exact_player=False):
+        """Return the moves solving puzzle stored for variant, or None.
+
+        Without exact_player the entry may have been stored from another cell
+        of the robot's region; the walk to that cell is prepended.
+        """
+        key, symmetry = SolutionCache.entry_key(puzzle, variant, exact_player)
+        row = self.db.execute("SELECT player, moves FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        player, moves = row
+        walk = puzzle.walk_path(symmetry.origin_cell(player))
+        if walk is None:  # Cannot happen for a matching region, but never return a wrong solution
+            self.misses += 1
+            return None
+        self.db.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return walk + symmetry.origin_moves(moves)
+
+    def put(self, puzzle, variant, moves, exact_player=False):
+        """Store the moves solving puzzle for variant, then evict old entries past the limits."""
+        key, symmetry = SolutionCache.entry_key(puzzle, variant, exact_player)
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("INSERT INTO solutions VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE "
+                            "SET player = excluded.player, moves = excluded.moves, used = excluded.used",
+                            (key, symmetry.cell(puzzle.player), symmetry.moves(moves), time.time()))
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache fits its limits (inside put's transaction)."""
+        while True:
+            entries, size = self.db.execute("SELECT entries, bytes FROM totals").fetchone()
+            if entries <= self.max_entries and size <= self.max_bytes:
+                return
+            # Drop a tenth of the entries at once so a full cache is not trimmed on every put
+            batch = max(1, entries - self.max_entries, entries // 10)
+            self.db.execute("DELETE FROM solutions WHERE key IN "
+                            "(SELECT key FROM solutions ORDER BY used LIMIT ?)", (batch,))
+
+    def __len__(self):
+        return self.db.execute("SELECT entries FROM totals").fetchone()[0]
+
+    def clear(self):
+        """Remove every entry."""
+        self.db.execute("DELETE FROM solutions")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
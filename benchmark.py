@@ -0,0 +1,223 @@
+import argparse
+import io
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Levels import iter_levels, generate_random_grid
+from Search import SearchStats
+from solve_levels import solve_level
+
+# Fixed hand-made levels of the corpus, in XSB format
+CORPUS_XSB = """
+Title: corridor
+######
+#.$ @#
+######
+
+Title: two-boxes
+########
+#  .   #
+# $$ @ #
+#  .   #
+########
+
+Title: three-boxes
+########
+#.  .  #
+# $$  @#
+# $   .#
+#      #
+########
+
+Title: spare-box
+#########
+#   #   #
+# $$  $ #
+#  ..  @#
+#  .#$  #
+#       #
+#########
+
+Title: four-boxes
+#########
+#   #   #
+# $$  $ #
+#  ..  @#
+#  .#$ .#
+#       #
+#########
+
+Title: room
+  #####
+###   #
+#.@$  #
+### $.#
+#.##$ #
+# # . ##
+#$ *$$.#
+#   .  #
+########
+
+Title: spare-dead-cell
+#######
+# $   #
+# $   #
+#.   @#
+#######
+
+Title: spare-frozen
+########
+# #   .#
+# $  $ #
+#$ #   #
+#@  .  #
+########
+
+Title: freeze-chain
+#########
+#   .   #
+# #$@   #
+#  $$   #
+#  $.*# #
+#   ##  #
+#  ..   #
+#########
+"""
+
+# Move-optimal solution lengths of levels that once broke a search, checked by check()
+OPTIMAL_MOVES = {
+    'spare-dead-cell': 9,  # A spare box has to be parked on a dead cell
+    'spare-frozen': 13,  # A spare box stays frozen off target
+    'freeze-chain': 24,  # A box is only frozen while its unfrozen neighbour is taken for a wall
+}
+
+# Seeded levels from the random generator that are solvable: (seed, rows, cols, boxes)
+CORPUS_SEEDS = ((7, 6, 6, 2), (8, 7, 7, 2), (4, 7, 7, 3), (9, 7, 8, 3), (9, 8, 8, 3), (8, 8, 8, 4))
+
+# Search configuration used unless another one is given on the command line
+DEFAULT_CONFIG = {'name': 'astar-h4', 'method': 'astar', 'heuristic': 4}
+
+
+def corpus():
+    """Return the (name, grid, robot_position) of every benchmark level, always in the same order."""
+    levels = list(iter_levels(io.StringIO(CORPUS_XSB)))
+    for seed, rows, cols, boxes in CORPUS_SEEDS:
+        grid, robot_position = generate_random_grid(rows, cols, boxes, boxes, random.Random(seed))
+        levels.append((f"random-{seed}-{rows}x{cols}-{boxes}", grid, robot_position))
+    return levels
+
+
+def bench_level(name, grid, robot_position, config, time_limit):
+    """Solve one level in a fresh process and return its measurements."""
+    stats = SearchStats(timing=True)
+    result = solve_level(None, name, grid, robot_position, config, time_limit, stats)
+    return {
+        'level': name,
+        'status': result['status'],
+        'solution_length': result['moves'],
+        'pushes': result['pushes'],
+        'bound': result['bound'],
+        'expanded': stats.expanded,
+        'generated': stats.generated,
+        'time': result['time'],
+        'nodes_per_second': round(stats.expanded / result['time']) if result['time'] else None,
+        'time_successors': round(stats.time_successors, 6),
+        'time_heuristic': round(stats.time_heuristic, 6),
+        'time_bookkeeping': round(stats.time_bookkeeping, 6),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run(config=DEFAULT_CONFIG, time_limit=60.0):
+    """Benchmark every corpus level, one fresh worker process per level so peak RSS is per level."""
+    results = []
+    # One level at a time: parallel levels would disturb each other's timings
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for name, grid, robot_position in corpus():
+            results.append(executor.submit(bench_level, name, grid, robot_position, config, time_limit).result())
+    return {
+        'config': config,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def check(report):
+    """Return a message for every level of OPTIMAL_MOVES left unsolved or solved with a wrong length.
+
+    A solution may never be shorter than the optimum, and one whose proven
+    bound is 1 (an optimal move-level search) must match it exactly.
+    """
+    exact = not report['config'].get('pushes')
+    failures = []
+    for result in report['results']:
+        optimum = OPTIMAL_MOVES.get(result['level'])
+        if optimum is None:
+            continue
+        length = result['solution_length']
+        if result['status'] != 'solved':
+            failures.append(f"{result['level']}: {result['status']}, expected {optimum} moves")
+        elif length < optimum or (exact and result['bound'] == 1 and length != optimum):
+            failures.append(f"{result['level']}: {length} moves, expected {optimum}")
+    return failures
+
+
+def compare(report, baseline):
+    """Print each level's time and node count next to a stored baseline report."""
+    before = {result['level']: result for result in baseline['results']}
+    print(f"{'level':<24}{'time':>10}{'baseline':>10}{'speedup':>9}{'nodes':>10}{'baseline':>10}")
+    for result in report['results']:
+        old = before.get(result['level'])
+        if old is None:
+            print(f"{result['level']:<24}{result['time']:>10.3f}{'-':>10}")
+            continue
+        speedup = old['time'] / result['time'] if result['time'] else float('inf')
+        print(f"{result['level']:<24}{result['time']:>10.3f}{old['time']:>10.3f}{speedup:>8.2f}x"
+              f"{result['expanded']:>10}{old['expanded']:>10}")
+
+
+def main(argv=None):
+    """Run the benchmark, print a summary, and optionally save it or compare it with a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the solver on a fixed level corpus.")
+    parser.add_argument('--method', choices=('astar', 'anytime', 'batch', 'bfs', 'bidirectional', 'external', 'idastar'), default=DEFAULT_CONFIG['method'])
+    parser.add_argument('--heuristic', type=int, choices=(1, 2, 3, 4), default=DEFAULT_CONFIG['heuristic'])
+    parser.add_argument('--pushes', action='store_true', help="search over box pushes instead of moves")
+    parser.add_argument('--macros', action='store_true', help="push through tunnels and into goal rooms in one step "
+                                                              "(implies --pushes)")
+    parser.add_argument('--weight', type=float, default=None,
+                        help="weighted A* factor (default 1), or the starting weight of anytime A* (default 5)")
+    parser.add_argument('--beam', type=int, help="keep only this many states per layer in --method batch (beam search)")
+    parser.add_argument('-t', '--time-limit', type=float, default=60.0, help="seconds per level")
+    parser.add_argument('--save', help="write the report to this JSON file")
+    parser.add_argument('--baseline', help="compare against a report saved earlier")
+    args = parser.parse_args(argv)
+
+    config = {'name': f"{args.method}-h{args.heuristic}", 'method': args.method, 'heuristic': args.heuristic,
+              'pushes': args.pushes or args.macros, 'macros': args.macros, 'table_size': 1 << 20, 'beam_width': args.beam}
+    config['weight'] = args.weight if args.weight is not None else 5 if args.method == 'anytime' else 1
+    report = run(config, args.time_limit)
+
+    if args.baseline:
+        with open(args.baseline) as stored:
+            compare(report, json.load(stored))
+    else:
+        json.dump(report['results'], sys.stdout, indent=1)
+        print()
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump(report, out, indent=1)
+    failures = check(report)
+    for failure in failures:
+        print(f"WRONG {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
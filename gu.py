@@ -1,8 +1,8 @@
 import tkinter as tk
-import random
 from PIL import Image, ImageTk  # Ensure you have PIL installed
 from SokobanPuzzle import SokobanPuzzle  # Import your SokobanPuzzle class
 from Node import Node  # Import your Node class
+from Levels import generate_random_grid
 
 class SokobanGUI:
     def __init__(self, master, puzzle, wall_image, robot_image):
@@ -111,52 +111,6 @@ class SokobanGUI:
         y = (self.master.winfo_screenheight() // 2) - (height // 2)
         self.master.geometry(f'{width}x{height}+{x}+{y}')
 
-def generate_random_grid(rows, cols, num_boxes, num_storage):
-    grid = [[' ' for _ in range(cols)] for _ in range(rows)]
-    
-    # Place outer walls
-    for r in range(rows):
-        grid[r][0] = 'O'
-        grid[r][cols - 1] = 'O'
-    for c in range(cols):
-        grid[0][c] = 'O'
-        grid[rows - 1][c] = 'O'
-
-    def is_valid_position(grid, r, c):
-        # Check if the position is valid for placing a box (not in a corner, etc.)
-        if grid[r][c] != ' ':
-            return False
-        if grid[r-1][c] == 'O' and grid[r][c-1] == 'O':
-            return False
-        if grid[r-1][c] == 'O' and grid[r][c+1] == 'O':
-            return False
-        if grid[r+1][c] == 'O' and grid[r][c-1] == 'O':
-            return False
-        if grid[r+1][c] == 'O' and grid[r][c+1] == 'O':
-            return False
-        return True
-
-    # Randomly place boxes (B) and storage locations (S)
-    placed_boxes = 0
-    placed_storage = 0
-    while placed_boxes < num_boxes or placed_storage < num_storage:
-        r, c = random.randint(1, rows-2), random.randint(1, cols-2)
-        if placed_boxes < num_boxes and is_valid_position(grid, r, c):
-            grid[r][c] = 'B'
-            placed_boxes += 1
-        elif placed_storage < num_storage and grid[r][c] == ' ':
-            grid[r][c] = 'S'
-            placed_storage += 1
-
-    while True:
-        r, c = random.randint(1, rows-2), random.randint(1, cols-2)
-        if grid[r][c] == ' ':
-            grid[r][c] = 'R'
-            robot_position = (r, c)
-            break
-    
-    return grid, robot_position
-
 if __name__ == "__main__":
     root = tk.Tk()
     rows, cols = 6, 6  # Example dimensions, you can adjust these
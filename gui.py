@@ -90,7 +90,7 @@ def main():
 
             # Draw the grid at the current step on the right
             if step_index < len(steps):
-                current_state = steps[step_index].state.grid  # Get the current state directly from steps
+                current_state = steps[step_index]  # get_path() returns the grid of every state on the path
                 draw_grid(screen, current_state)  # Pass the state directly to draw_grid
                 step_index += 1  # Move to the next step in the solution
 
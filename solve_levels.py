@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Levels import iter_levels
+from Patterns import PatternStore
+from Portfolio import run_config
+from Search import SearchObserver, SearchStats
+from SokobanPuzzle import SokobanPuzzle
+from SolutionCache import SolutionCache
+
+
+# Seconds past the time limit before the alarm interrupts a level stuck outside the search loop
+ALARM_GRACE = 1.0
+
+
+class LevelTimeout(Exception):
+    """Raised in a worker when a level runs past its time limit."""
+
+
+def _on_alarm(signum, frame):
+    raise LevelTimeout()
+
+
+def _limit_memory(memory_limit):
+    """Worker initializer: cap the address space of the worker process (in MB)."""
+    if memory_limit:
+        import resource
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def solve_level(index, title, grid, robot_position, config, time_limit, stats=None, progress=0, node_limit=None,
+                cache_path=None, patterns_path=None):
+    """Solve one level in a worker process and return its JSON-ready result (search counters go to stats).
+
+    With progress > 0 a JSON progress line tagged with the level is written
+    to stderr every progress seconds; node_limit caps the nodes expanded.
+    cache_path names an SQLite SolutionCache shared by every worker, and
+    patterns_path a pattern folder whose deadlock patterns are used and extended.
+    nodes is the number of nodes expanded, whether the level was solved or not.
+    """
+    start = time.perf_counter()
+    stats = stats if stats is not None else SearchStats()
+
+    def show(report):
+        print(json.dumps({'level': index, **report}), file=sys.stderr, flush=True)
+    # The observer stops the search itself at the time limit, so the node count of a timeout is recorded too
+    observer = SearchObserver(interval=progress, node_budget=node_limit, time_budget=time_limit or None,
+                              callback=show if progress else None)
+    result = {'level': index, 'title': title, 'status': None, 'solution': None,
+              'moves': None, 'pushes': None, 'bound': None, 'nodes': None, 'time': None}
+    if time_limit:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, time_limit + ALARM_GRACE)
+    patterns = None
+    try:
+        puzzle = SokobanPuzzle(grid, robot_position)
+        if patterns_path:
+            patterns = PatternStore(puzzle.level, patterns_path)
+            puzzle.level.deadlocks.patterns = patterns
+        if cache_path:
+            with SolutionCache(cache_path) as cache:
+                solved = run_config(puzzle, config, stats, observer, cache)
+        else:
+            solved = run_config(puzzle, config, stats, observer)
+        result['status'] = 'solved' if solved['moves'] is not None else 'unsolvable'
+        if solved['moves'] is None and observer.stopped == 'nodes':
+            result['status'] = 'node-limit'
+        elif solved['moves'] is None and observer.stopped == 'time':
+            result['status'] = 'timeout'
+        if solved['moves'] is not None:
+            result['solution'] = solved['moves']
+            result['moves'] = len(solved['moves'])
+            result['pushes'] = solved['pushes']
+            result['bound'] = solved['bound']
+    except LevelTimeout:
+        result['status'] = 'timeout'
+    except MemoryError:
+        result['status'] = 'memory'
+    finally:
+        if time_limit:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    if patterns is not None:  # Patterns learned before a timeout are still valid
+        patterns.save()
+    result['nodes'] = stats.expanded
+    result['time'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def main(argv=None):
+    """Solve every level of a collection in parallel, printing one JSON line per level as it finishes."""
+    parser = argparse.ArgumentParser(description="Solve a collection of Sokoban levels headlessly.")
+    parser.add_argument('levels', help="XSB level collection")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('-t', '--time-limit', type=float, default=60.0, help="seconds per level (0 for none)")
+    parser.add_argument('-m', '--memory-limit', type=int, default=0, help="MB per worker process (0 for none)")
+    parser.add_argument('--method', choices=('astar', 'anytime', 'batch', 'bfs', 'bidirectional', 'external', 'idastar'), default='astar')
+    parser.add_argument('--heuristic', type=int, choices=(1, 2, 3, 4), default=4)
+    parser.add_argument('--pushes', action='store_true', help="search over box pushes instead of moves")
+    parser.add_argument('--macros', action='store_true', help="push through tunnels and into goal rooms in one step "
+                                                              "(implies --pushes)")
+    parser.add_argument('--weight', type=float, default=None,
+                        help="weighted A* factor (default 1), or the starting weight of anytime A* (default 5)")
+    parser.add_argument('-n', '--node-limit', type=int, help="nodes expanded per level")
+    parser.add_argument('--progress', type=float, default=0, help="seconds between progress lines on stderr (0 for none)")
+    parser.add_argument('--beam', type=int, help="keep only this many states per layer in --method batch (beam search)")
+    parser.add_argument('--runs-dir', help="folder for the on-disk visited set of --method external (default: temp)")
+    parser.add_argument('--cache', help="SQLite solution cache reused across runs")
+    parser.add_argument('--patterns', help="folder of deadlock patterns learned and reused across runs")
+    parser.add_argument('-o', '--output', help="write the JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    config = {'name': args.method, 'method': args.method, 'heuristic': args.heuristic,
+              'pushes': args.pushes or args.macros, 'macros': args.macros, 'table_size': 1 << 20, 'directory': args.runs_dir,
+              'beam_width': args.beam}
+    config['weight'] = args.weight if args.weight is not None else 5 if args.method == 'anytime' else 1
+    if args.method == 'anytime' and args.time_limit:
+        config['time_budget'] = 0.9 * args.time_limit  # Stop improving before the hard limit kills the level
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_limit_memory,
+                                 initargs=(args.memory_limit,)) as executor:
+            levels = enumerate(iter_levels(args.levels), 1)  # Parsed lazily, one level at a time
+            pending = set()
+            while True:
+                # Keep a bounded number of levels in flight so huge collections are never all in memory
+                for index, (title, grid, robot_position) in levels:
+                    pending.add(executor.submit(solve_level, index, title, grid, robot_position,
+                                                config, args.time_limit, None, args.progress, args.node_limit,
+                                                args.cache, args.patterns))
+                    if len(pending) >= 2 * args.workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    out.write(json.dumps(future.result()) + '\n')
+                    out.flush()  # Stream each level as soon as it finishes
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()